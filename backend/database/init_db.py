@@ -1,9 +1,25 @@
 import os
+from functools import lru_cache
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-from urllib.parse import urlparse
+from urllib.parse import unquote, urlparse
 from dotenv import load_dotenv
 
+@lru_cache(maxsize=8)
+def _parse_database_url(db_url):
+    """Split a DATABASE_URL into (host, port, username, password, db_name)."""
+    # Parse database URL using urlparse to handle query parameters
+    parsed = urlparse(db_url)
+    
+    host = parsed.hostname or "localhost"
+    port = str(parsed.port) if parsed.port else "5432"
+    # urlparse leaves credentials percent-encoded (e.g. "p%40ss" for "p@ss")
+    username = unquote(parsed.username or "") or "postgres"
+    password = unquote(parsed.password or "")
+    db_name = parsed.path.lstrip('/') or "journaling_app"
+    return host, port, username, password, db_name
+
 def create_database_and_extension():
     """Initialize PostgreSQL database with pgvector extension"""
     
@@ -11,52 +27,37 @@ def create_database_and_extension():
     load_dotenv()
     
     db_url = os.getenv("DATABASE_URL", "postgresql://localhost/journaling_app")
+    host, port, username, password, db_name = _parse_database_url(db_url)
     
-    # Parse database URL using urlparse to handle query parameters
-    parsed = urlparse(db_url)
-    
-    host = parsed.hostname or "localhost"
-    port = str(parsed.port) if parsed.port else "5432"
-    username = parsed.username or "postgres"
-    password = parsed.password or ""
-    db_name = parsed.path.lstrip('/') or "journaling_app"
-    
-    try:
-        # Connect to default postgres database first
+    def _connect(database):
         conn = psycopg2.connect(
             host=host,
             port=port,
             user=username,
             password=password,
-            database="postgres",
+            database=database,
             sslmode="require"
         )
         conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        
-        cursor = conn.cursor()
-        
-        # Create database if it doesn't exist
-        cursor.execute(f"SELECT 1 FROM pg_catalog.pg_database WHERE datname = '{db_name}'")
-        exists = cursor.fetchone()
-        if not exists:
-            cursor.execute(f'CREATE DATABASE "{db_name}"')
-            print(f"Created database: {db_name}")
-        else:
+        return conn
+    
+    try:
+        # The target database almost always exists; try it first and only
+        # fall back to the default postgres database to create it.
+        try:
+            conn = _connect(db_name)
             print(f"Database {db_name} already exists")
-        
-        cursor.close()
-        conn.close()
-        
-        # Connect to the actual database and create extension
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            user=username,
-            password=password,
-            database=db_name,
-            sslmode="require"
-        )
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        except psycopg2.OperationalError as e:
+            # A missing database surfaces at connect time without a pgcode
+            if "does not exist" not in str(e):
+                raise
+            conn = _connect("postgres")
+            cursor = conn.cursor()
+            cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
+            print(f"Created database: {db_name}")
+            cursor.close()
+            conn.close()
+            conn = _connect(db_name)
         
         cursor = conn.cursor()
         
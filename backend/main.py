@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable
 import os
-import json
-from dotenv import load_dotenv
+import re
+import time
+import orjson
+import asyncio
+import numpy as np
+from contextlib import asynccontextmanager
+from dotenv import dotenv_values
 from pathlib import Path
 
 from services.ai_service import AIService
@@ -14,25 +19,67 @@ from services.memory_service import MemoryService
 from services.vector_insights_service import VectorInsightsService
 from services.auth import get_current_user_id
 from services.crypto_utils import decrypt_text_for_user
+from services.db_pool import close_pool
+from services.http_client import close_client
 
 base_dir = Path(__file__).resolve().parent
-# Load env from backend/.env then project root .env
-load_dotenv(base_dir / ".env")
-load_dotenv(base_dir.parent / ".env")
+# Load env from backend/.env and project root .env in one pass; backend/.env wins over
+# the root file and real environment variables win over both
+for _key, _value in {**dotenv_values(base_dir.parent / ".env"), **dotenv_values(base_dir / ".env")}.items():
+    if _value is not None:
+        os.environ.setdefault(_key, _value)
+
+# Service singletons, built by lifespan() at startup
+ai_service: AIService
+memory_service: MemoryService
+vector_insights_service: VectorInsightsService
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Construct the services concurrently on startup; release the DB pool on shutdown."""
+    global ai_service, memory_service, vector_insights_service
+    ai_service, memory_service, vector_insights_service = await asyncio.gather(
+        asyncio.to_thread(AIService),
+        asyncio.to_thread(MemoryService),
+        asyncio.to_thread(VectorInsightsService),
+    )
+    app.state.ai = ai_service
+    app.state.memory = memory_service
+    app.state.vi = vector_insights_service
+    try:
+        yield
+    finally:
+        await close_client()
+        close_pool()
+
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Configure CORS: allow localhost in dev plus any origins from FRONTEND_ORIGINS (comma-separated)
 frontend_origins_env = os.getenv("FRONTEND_ORIGINS") or os.getenv("FRONTEND_ORIGIN") or ""
-extra_origins = [o.strip() for o in frontend_origins_env.split(",") if o.strip()]
-allow_origins = ["http://localhost:5173", "http://127.0.0.1:5173"] + extra_origins
+extra_origins = [o.strip().rstrip("/") for o in frontend_origins_env.split(",") if o.strip()]
+configured_origins = ["http://localhost:5173", "http://127.0.0.1:5173"] + extra_origins
+# Exact origins go in a frozenset (Starlette only tests membership); wildcard entries such as
+# https://*.vercel.app become one regex, with each "*" matching a run of hostname characters.
+# A bare "*" stays in the set, where Starlette treats it as allow-all.
+allow_origins = frozenset(o for o in configured_origins if o == "*" or "*" not in o)
+wildcard_origins = [o for o in configured_origins if o != "*" and "*" in o]
+allow_origin_regex = None
+if wildcard_origins:
+    allow_origin_regex = "|".join(
+        "[A-Za-z0-9.-]+".join(re.escape(part) for part in o.split("*")) for o in wildcard_origins
+    )
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
+    allow_origin_regex=allow_origin_regex,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Only what the frontend actually sends; max_age lets browsers cache preflights for 10 minutes
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
+    allow_headers=["authorization", "content-type"],
+    max_age=600,
 )
 
 # Warn if encryption secret is not configured (journals/goals would be stored in plaintext)
@@ -59,17 +106,85 @@ async def encryption_status():
             reason = f"cryptography not available: {e.__class__.__name__}"
     return {"encryption_enabled": enabled, "has_secret": has_secret, "reason": reason}
 
-ai_service = AIService()
-memory_service = MemoryService()
-vector_insights_service = VectorInsightsService()
+# In-process cache for the expensive insights responses. Keys include the user's journal
+# version (entry count + latest updated_at), so any create/edit/delete misses naturally;
+# the TTL only bounds how long an unchanged result is reused.
+try:
+    RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+except Exception:
+    RESPONSE_CACHE_TTL_SECONDS = 300
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+_response_cache: Dict[tuple, Tuple[float, Any]] = {}
+_response_cache_locks: Dict[tuple, asyncio.Lock] = {}
+
+async def cached_insights_response(clerk_user_id: str, key: tuple, build: Callable[[], Awaitable[Any]]) -> Any:
+    """Return build()'s result, reusing a cached copy while the user's journal is unchanged."""
+    version = await asyncio.to_thread(memory_service.get_journal_version, clerk_user_id)
+    if version is None:
+        return await build()
+    cache_key = (clerk_user_id, version) + key
+
+    def lookup():
+        cached = _response_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] <= RESPONSE_CACHE_TTL_SECONDS:
+            return cached
+        return None
+
+    hit = lookup()
+    if hit:
+        return hit[1]
+    # One computation per key; concurrent requests wait for it instead of recomputing
+    lock = _response_cache_locks.setdefault(cache_key, asyncio.Lock())
+    try:
+        async with lock:
+            hit = lookup()
+            if hit:
+                return hit[1]
+            value = await build()
+            _response_cache.pop(cache_key, None)
+            while len(_response_cache) >= RESPONSE_CACHE_MAX_ENTRIES:
+                # Dicts keep insertion order, so the first key is the oldest entry
+                _response_cache.pop(next(iter(_response_cache)))
+            _response_cache[cache_key] = (time.monotonic(), value)
+            return value
+    finally:
+        _response_cache_locks.pop(cache_key, None)
 
 class ChatRequest(BaseModel):
     message: str
 
 class ChatResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     response: str
     timestamp: datetime
 
+def safe_datetime_parse(dt_value, default: Optional[datetime] = None) -> datetime:
+    """Coerce a created_at value (datetime or ISO string) to a datetime.
+
+    psycopg2 already returns TIMESTAMP columns as datetimes, so that is the fast path;
+    unparseable values fall back to `default` (now if not given).
+    """
+    if isinstance(dt_value, datetime):
+        return dt_value
+    if isinstance(dt_value, str):
+        try:
+            return datetime.fromisoformat(dt_value.replace('Z', '+00:00'))
+        except Exception:
+            pass
+    elif hasattr(dt_value, 'year'):  # date-like object
+        return dt_value
+    return default or datetime.now()
+
+def created_at_array(entries, now: Optional[datetime] = None) -> np.ndarray:
+    """Return the entries' created_at values as a datetime64 array for vectorized filtering."""
+    try:
+        return np.array([e["created_at"] for e in entries], dtype="datetime64[us]")
+    except Exception:
+        # Mixed/odd values (e.g. tz-suffixed strings): normalize one by one
+        now = now or datetime.now()
+        return np.array([safe_datetime_parse(e.get("created_at"), now) for e in entries], dtype="datetime64[us]")
+
 @app.get("/")
 async def root():
     return {"message": "AI Journaling Companion API"}
@@ -79,15 +194,15 @@ async def chat(request: ChatRequest, clerk_user_id: str = Depends(get_current_us
     try:
         user_message = request.message
         # ensure user exists in DB
-        memory_service.ensure_user(clerk_user_id)
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
 
     # Get relevant memories for context (from journal entries only)
         relevant_memories = await memory_service.get_relevant_memories(clerk_user_id, user_message)
         # Fetch user goals to steer responses
-        user_goals = memory_service.get_user_goals(clerk_user_id)
+        user_goals = await asyncio.to_thread(memory_service.get_user_goals, clerk_user_id)
         # Fetch user privacy settings
         # Generate AI response (PII is sanitized inside AI service)
-        ai_response = await ai_service.generate_response(user_message, relevant_memories, user_goals)
+        ai_response = await ai_service.generate_response(user_message, relevant_memories, user_goals, clerk_user_id)
 
         return ChatResponse(response=ai_response, timestamp=datetime.now())
 
@@ -99,26 +214,27 @@ async def chat_stream(request: ChatRequest, clerk_user_id: str = Depends(get_cur
     try:
         user_message = request.message
         # ensure user exists in DB
-        memory_service.ensure_user(clerk_user_id)
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
 
     # Get relevant memories for context (from journal entries only)
         relevant_memories = await memory_service.get_relevant_memories(clerk_user_id, user_message)
         # Fetch user goals to steer responses
-        user_goals = memory_service.get_user_goals(clerk_user_id)
+        user_goals = await asyncio.to_thread(memory_service.get_user_goals, clerk_user_id)
         
         async def generate():
-            full_response = ""
-            async for chunk in ai_service.generate_response_stream(user_message, relevant_memories, user_goals):
-                full_response += chunk
-                # Use proper JSON encoding for the chunk
-                chunk_data = {"content": chunk}
-                # Send each chunk as a Server-Sent Event
-                yield f"data: {json.dumps(chunk_data)}\n\n"
-            
+            async for chunk in ai_service.generate_response_stream(user_message, relevant_memories, user_goals, clerk_user_id):
+                # Send each chunk as a Server-Sent Event; orjson emits bytes, so no re-encode
+                yield b"data: " + orjson.dumps({"content": chunk}) + b"\n\n"
+
             # Send completion signal
-            yield f"data: [DONE]\n\n"
+            yield b"data: [DONE]\n\n"
 
-        return StreamingResponse(generate(), media_type="text/event-stream")
+        return StreamingResponse(
+            generate(),
+            media_type="text/event-stream",
+            # Keep caches and reverse proxies (nginx) from buffering the stream
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -128,14 +244,13 @@ async def health_check():
     return {"status": "healthy"}
 
 
-from typing import Optional, List
-
-
 class JournalCreate(BaseModel):
     title: Optional[str] = None  # Optional title
     content: str
 
 class JournalItem(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: int
     title: Optional[str] = None
     content: str
@@ -144,48 +259,43 @@ class JournalItem(BaseModel):
 
 
 @app.get("/journal")
-async def list_journal(clerk_user_id: str = Depends(get_current_user_id), limit: int = 10, offset: int = 0):
-    memory_service.ensure_user(clerk_user_id)
+async def list_journal(clerk_user_id: str = Depends(get_current_user_id), limit: int = 10, offset: int = 0, stream: bool = False):
+    """List journal entries newest-first.
+
+    - Set stream=true to receive every entry from `offset` as NDJSON (one entry per line),
+      read from a server-side cursor instead of being materialized in memory.
+    """
+    await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+    offset = max(0, offset)
+    if stream:
+        rows = memory_service.iter_journal_entries(clerk_user_id, offset=offset)
+        return StreamingResponse((orjson.dumps(row) + b"\n" for row in rows), media_type="application/x-ndjson")
     # Clamp values for safety
     limit = max(1, min(limit, 100))
-    offset = max(0, offset)
-    items = memory_service.list_journal_entries(clerk_user_id, limit=limit, offset=offset)
+    items = await asyncio.to_thread(memory_service.list_journal_entries, clerk_user_id, limit=limit, offset=offset)
     return items
 
 @app.get("/journal/count")
 async def count_journal(clerk_user_id: str = Depends(get_current_user_id)):
-    memory_service.ensure_user(clerk_user_id)
-    try:
-        # Lightweight count
-        conn = memory_service._connect()  # internal use
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM journal_entries WHERE clerk_user_id = %s", (clerk_user_id,))
-        row = cur.fetchone()
-        n = int(row[0]) if row else 0
-        cur.close()
-        conn.close()
-        return {"count": n}
-    except Exception:
-        return {"count": 0}
+    await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+    return {"count": await asyncio.to_thread(memory_service.count_journal_entries, clerk_user_id)}
 
 
 @app.post("/journal")
 async def create_journal(payload: JournalCreate, clerk_user_id: str = Depends(get_current_user_id)):
-    memory_service.ensure_user(clerk_user_id)
-    new_id = memory_service.create_journal_entry(clerk_user_id, payload.title, payload.content)
-    if not new_id:
+    await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+    item = await asyncio.to_thread(memory_service.create_journal_entry, clerk_user_id, payload.title, payload.content)
+    if not item:
         raise HTTPException(status_code=500, detail="Failed to create journal entry")
-    # Return the new item by listing and finding it; for simplicity
-    items = memory_service.list_journal_entries(clerk_user_id, limit=1)
-    if items:
-        return items[0]
-    raise HTTPException(status_code=500, detail="Failed to load created journal entry")
+    return item
 
 
 # Conversations endpoint removed for privacy.
 
 
 class OpeningPromptResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     message: str
     timestamp: datetime
 
@@ -194,16 +304,14 @@ class OpeningPromptResponse(BaseModel):
 async def get_opening_prompt(clerk_user_id: str = Depends(get_current_user_id)):
     """Generate a contextual opening prompt based on user's recent journal entries."""
     try:
-        memory_service.ensure_user(clerk_user_id)
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
 
         # Get recent journal entries for context
-        recent_entries = memory_service.list_journal_entries(clerk_user_id, limit=3)
+        recent_entries = await asyncio.to_thread(memory_service.list_journal_entries, clerk_user_id, limit=3)
         journal_content = [entry.get("content", "") for entry in recent_entries if entry.get("content")]
 
         # Include user goals in prompt generation
-        user_goals = memory_service.get_user_goals(clerk_user_id)
-        # Include user goals in prompt generation
-        user_goals = memory_service.get_user_goals(clerk_user_id)
+        user_goals = await asyncio.to_thread(memory_service.get_user_goals, clerk_user_id)
 
         # Generate opening prompt (PII is sanitized inside AI service)
         opening_message = await ai_service.generate_opening_prompt(journal_content, user_goals)
@@ -214,38 +322,56 @@ async def get_opening_prompt(clerk_user_id: str = Depends(get_current_user_id)):
 
 
 class JournalInsightsResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     entry_id: int
     insights: Dict[str, Any]
     generated_at: datetime
 
 
 class TrendsAnalysisResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     analysis: Dict[str, Any]
     generated_at: datetime
     entries_analyzed: int
 
 
 @app.get("/journal/{entry_id}/insights", response_model=JournalInsightsResponse)
-async def get_journal_insights(entry_id: int, clerk_user_id: str = Depends(get_current_user_id)):
-    """Get AI-powered insights for a specific journal entry."""
+async def get_journal_insights(entry_id: int, request: Request, response: Response, clerk_user_id: str = Depends(get_current_user_id)):
+    """Get AI-powered insights for a specific journal entry.
+
+    Responses served from the analysis cache carry an ETag derived from that cache entry;
+    a matching If-None-Match gets a 304 while the entry is still cached. Fallback analyses
+    get no ETag, so the browser asks again instead of holding on to them.
+    """
     try:
-        memory_service.ensure_user(clerk_user_id)
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
 
         # Get the specific journal entry
-        entries = memory_service.list_journal_entries(clerk_user_id, limit=100)
-        entry = next((e for e in entries if e["id"] == entry_id), None)
+        entry = await asyncio.to_thread(memory_service.get_journal_entry, clerk_user_id, entry_id)
 
         if not entry:
             raise HTTPException(status_code=404, detail="Journal entry not found")
 
+        updated_at = entry.get("updated_at")
+        etag = vector_insights_service.insights_etag(entry_id, updated_at)
+        if etag and etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            # Browsers may keep the copy but must revalidate, so an edit shows up immediately
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
         # Analyze the entry for insights (cached by entry id + updated_at)
         insights = await vector_insights_service.analyze_journal_entry_fast_cached(
             entry.get("content", ""),
             entry_id,
             clerk_user_id,
-            entry.get("updated_at")
+            updated_at
         )
 
+        etag = vector_insights_service.insights_etag(entry_id, updated_at)
+        if etag:
+            response.headers.update({"ETag": etag, "Cache-Control": "private, no-cache"})
+
         return JournalInsightsResponse(
             entry_id=entry_id,
             insights=insights,
@@ -263,10 +389,14 @@ async def get_journal_insights(entry_id: int, clerk_user_id: str = Depends(get_c
 
 
 class SparklinePoint(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     date: str
     score: float
 
 class SparklineResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     points: list[SparklinePoint]
     window_days: int
     entries: int
@@ -275,29 +405,24 @@ class SparklineResponse(BaseModel):
 async def get_sentiment_sparkline(clerk_user_id: str = Depends(get_current_user_id), days: int = 30):
     """Return a simple daily sentiment sparkline for the last N days."""
     try:
-        memory_service.ensure_user(clerk_user_id)
-        entries = memory_service.list_journal_entries(clerk_user_id, limit=200)
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
         cutoff = datetime.now() - timedelta(days=days)
+        # Only entries inside the window come back from the DB. `entries` in the response keeps
+        # its meaning of how many of the user's latest entries were considered (up to 200).
+        entries, total = await asyncio.gather(
+            asyncio.to_thread(memory_service.list_entries_since, clerk_user_id, cutoff, limit=200),
+            asyncio.to_thread(memory_service.count_journal_entries, clerk_user_id),
+        )
         # Use vector insights service to get per-entry quick sentiment (reuse analyze_journal_entry_fast)
+        eligible = [e for e in entries if e.get("id") is not None]
+        results = await vector_insights_service.batch_analyze_cached(eligible, clerk_user_id)
         points_raw = []
-        for e in entries:
-            created = e.get("created_at")
-            dt = created if hasattr(created, 'year') else None
-            if isinstance(created, str):
-                try:
-                    dt = datetime.fromisoformat(created.replace('Z', '+00:00'))
-                except:
-                    dt = datetime.now()
-            if not dt or dt < cutoff:
+        for e, insight in zip(eligible, results):
+            dt = e["created_at"]
+            if isinstance(insight, Exception):
                 continue
             try:
-                eid_val = e.get("id")
-                if eid_val is None:
-                    continue
-                eid = int(eid_val)
-                insight = await vector_insights_service.analyze_journal_entry_fast_cached(e.get("content", ""), eid, clerk_user_id, e.get("updated_at"))
-                score = float(insight.get("sentiment_score", 0.5))
-                points_raw.append((dt.date().isoformat(), score))
+                points_raw.append((dt.date().isoformat(), float(insight.get("sentiment_score", 0.5))))
             except Exception:
                 continue
         # Aggregate by day (average)
@@ -305,13 +430,15 @@ async def get_sentiment_sparkline(clerk_user_id: str = Depends(get_current_user_
         for d, s in points_raw:
             daily.setdefault(d, []).append(s)
         points = [SparklinePoint(date=k, score=sum(v)/len(v)) for k, v in sorted(daily.items())]
-        return SparklineResponse(points=points, window_days=days, entries=len(entries))
+        return SparklineResponse(points=points, window_days=days, entries=min(total, 200))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sparkline error: {str(e)}")
 
 
 # --- P3: Engagement streaks & keyword cloud ---
 class StreaksResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     current_streak: int
     best_streak: int
     active_days_last_30: int
@@ -320,65 +447,26 @@ class StreaksResponse(BaseModel):
 async def get_streaks(clerk_user_id: str = Depends(get_current_user_id)):
     """Compute journaling streaks from journal entries created_at dates."""
     try:
-        memory_service.ensure_user(clerk_user_id)
-        entries = memory_service.list_journal_entries(clerk_user_id, limit=365)
-
-        # Collect unique active dates (date strings in ISO)
-        dates: set[str] = set()
-        for e in entries:
-            dt = e.get('created_at')
-            if isinstance(dt, str):
-                try:
-                    d = datetime.fromisoformat(dt.replace('Z','+00:00')).date()
-                except Exception:
-                    continue
-            elif dt is not None and hasattr(dt, 'date'):
-                try:
-                    d = dt.date()  # type: ignore[assignment]
-                except Exception:
-                    continue
-            else:
-                continue
-            dates.add(d.isoformat())
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+        # Distinct active days over the last year, oldest first
+        date_objs = await asyncio.to_thread(memory_service.list_active_dates, clerk_user_id, limit_days=365)
 
-        if not dates:
+        if not date_objs:
             return StreaksResponse(current_streak=0, best_streak=0, active_days_last_30=0)
 
-        # Compute current and best streaks
-        sorted_days = sorted(dates)
-        # Convert back to date objects for math
-        from datetime import date as _date
-        date_objs = [datetime.fromisoformat(d).date() for d in sorted_days]
-        best = 1
-        curr = 1
-        for i in range(1, len(date_objs)):
-            if (date_objs[i] - date_objs[i-1]).days == 1:
-                curr += 1
-                best = max(best, curr)
-            elif date_objs[i] == date_objs[i-1]:
-                continue
-            else:
-                curr = 1
-
-        # Current streak up to today
-        today = datetime.now().date()
-        current_streak = 0
-        if date_objs[-1] == today:
-            # walk backwards while consecutive
-            current_streak = 1
-            i = len(date_objs) - 1
-            while i > 0 and (date_objs[i] - date_objs[i-1]).days == 1:
-                current_streak += 1
-                i -= 1
-        elif (today - date_objs[-1]).days == 1:
-            # streak ended yesterday
-            current_streak = 0
-        else:
-            current_streak = 0
+        # Compute current and best streaks: split the sorted days into runs of consecutive days
+        days_arr = np.array(date_objs, dtype="datetime64[D]")
+        gaps = np.diff(days_arr).astype("int64")
+        run_starts = np.flatnonzero(np.r_[True, gaps != 1])
+        run_lengths = np.diff(np.r_[run_starts, len(days_arr)])
+        best = int(run_lengths.max())
+
+        # Current streak up to today (the final run, if it ends today)
+        today = np.datetime64(datetime.now().date(), "D")
+        current_streak = int(run_lengths[-1]) if days_arr[-1] == today else 0
 
         # Active days in last 30
-        cutoff = today - timedelta(days=29)
-        active_last_30 = sum(1 for d in date_objs if d >= cutoff)
+        active_last_30 = int(np.count_nonzero(days_arr >= today - np.timedelta64(29, "D")))
 
         return StreaksResponse(current_streak=current_streak, best_streak=best, active_days_last_30=active_last_30)
     except Exception as e:
@@ -386,36 +474,27 @@ async def get_streaks(clerk_user_id: str = Depends(get_current_user_id)):
 
 
 class KeywordItem(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     word: str
     count: int
     weight: float
 
 class KeywordCloudResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     keywords: list[KeywordItem]
 
 @app.get("/insights/keywords", response_model=KeywordCloudResponse)
 async def get_keyword_cloud(clerk_user_id: str = Depends(get_current_user_id), days: int = 60, top_n: int = 30):
     """Return top keywords across recent entries for a simple word cloud."""
     try:
-        memory_service.ensure_user(clerk_user_id)
-        entries = memory_service.list_journal_entries(clerk_user_id, limit=200)
-
-        def safe_datetime_parse(dt_value):
-            if isinstance(dt_value, str):
-                try:
-                    return datetime.fromisoformat(dt_value.replace('Z', '+00:00'))
-                except:
-                    return datetime.now()
-            elif dt_value is not None and hasattr(dt_value, 'year'):
-                return dt_value
-            else:
-                return datetime.now()
-
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
         if days > 0:
             cutoff_date = datetime.now() - timedelta(days=days)
-            recent_entries = [e for e in entries if safe_datetime_parse(e.get('created_at')) >= cutoff_date]
+            recent_entries = await asyncio.to_thread(memory_service.list_entries_since, clerk_user_id, cutoff_date, limit=200)
         else:
-            recent_entries = entries
+            recent_entries = await asyncio.to_thread(memory_service.list_journal_entries, clerk_user_id, limit=200)
 
         extractor = getattr(vector_insights_service, "fast_extract_keywords", None)
         keywords_data = extractor([dict(e) for e in recent_entries], top_n=top_n) if callable(extractor) else []
@@ -434,41 +513,28 @@ async def get_keyword_cloud(clerk_user_id: str = Depends(get_current_user_id), d
 async def get_emotional_trends(clerk_user_id: str = Depends(get_current_user_id), days: int = 30):
     """Get emotional trends and patterns analysis across journal entries."""
     try:
-        memory_service.ensure_user(clerk_user_id)
-
-        # Get recent journal entries for trend analysis
-        all_entries = memory_service.list_journal_entries(clerk_user_id, limit=50)
-
-        # Helper function to safely parse datetime
-        def safe_datetime_parse(dt_value):
-            if isinstance(dt_value, str):
-                try:
-                    return datetime.fromisoformat(dt_value.replace('Z', '+00:00'))
-                except:
-                    return datetime.now()
-            elif hasattr(dt_value, 'year'):  # datetime object
-                return dt_value
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+
+        async def build_trends():
+            now = datetime.now()
+
+            # Get recent journal entries for trend analysis, filtered by date range in SQL if needed
+            if days > 0:
+                cutoff_date = now - timedelta(days=days)
+                recent_entries = await asyncio.to_thread(memory_service.list_entries_since, clerk_user_id, cutoff_date, limit=50)
             else:
-                return datetime.now()
+                recent_entries = await asyncio.to_thread(memory_service.list_journal_entries, clerk_user_id, limit=50)
 
-        # Filter entries by date range if needed
-        if days > 0:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            recent_entries = [
-                entry for entry in all_entries
-                if safe_datetime_parse(entry["created_at"]) >= cutoff_date
-            ]
-        else:
-            recent_entries = all_entries
+            # Analyze trends using fast vector-based analysis
+            trends = await vector_insights_service.analyze_trends_fast([dict(e) for e in recent_entries])
 
-        # Analyze trends using fast vector-based analysis
-        trends = await vector_insights_service.analyze_trends_fast([dict(e) for e in recent_entries])
+            return TrendsAnalysisResponse(
+                analysis=trends,
+                generated_at=now,
+                entries_analyzed=len(recent_entries)
+            )
 
-        return TrendsAnalysisResponse(
-            analysis=trends,
-            generated_at=datetime.now(),
-            entries_analyzed=len(recent_entries)
-        )
+        return await cached_insights_response(clerk_user_id, ("trends", days), build_trends)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=f"Analysis error: {str(ve)}")
     except RuntimeError as re:
@@ -481,100 +547,79 @@ async def get_emotional_trends(clerk_user_id: str = Depends(get_current_user_id)
 async def get_insights_dashboard(clerk_user_id: str = Depends(get_current_user_id)):
     """Get comprehensive dashboard data including trends, recent insights, and statistics."""
     try:
-        memory_service.ensure_user(clerk_user_id)
-
-        # Get journal entries
-        entries = memory_service.list_journal_entries(clerk_user_id, limit=30)
-
-        # Helper function to safely parse datetime
-        def safe_datetime_parse(dt_value):
-            if isinstance(dt_value, str):
-                try:
-                    return datetime.fromisoformat(dt_value.replace('Z', '+00:00'))
-                except Exception:
-                    return datetime.now()
-            elif hasattr(dt_value, 'year'):  # datetime object
-                return dt_value
-            else:
-                return datetime.now()
-
-        # Basic statistics
-        cutoff_week = datetime.now() - timedelta(days=7)
-        cutoff_month = datetime.now() - timedelta(days=30)
-
-        stats = {
-            "total_entries": len(entries),
-            "entries_this_week": len([
-                e for e in entries
-                if safe_datetime_parse(e["created_at"]) >= cutoff_week
-            ]),
-            "entries_this_month": len([
-                e for e in entries
-                if safe_datetime_parse(e["created_at"]) >= cutoff_month
-            ])
-        }
-
-        # Get recent trends using fast vector-based analysis
-        try:
-            trends = await vector_insights_service.analyze_trends_fast([dict(e) for e in entries[:10]])
-        except (ValueError, RuntimeError) as e:
-            raise HTTPException(status_code=400, detail=f"Trend analysis failed: {str(e)}")
-
-        # Get insights for most recent entries
-        recent_insights = []
-        analysis_errors = []
-
-        if len(entries) > 0:
-            for entry in entries[:5]:  # Last 5 entries
-                try:
-                    eid_val = entry.get("id")
-                    if eid_val is None:
-                        continue
-                    insights = await vector_insights_service.analyze_journal_entry_fast_cached(
-                        entry.get("content", ""),
-                        eid_val,
-                        clerk_user_id,
-                        entry.get("updated_at")
-                    )
-                    recent_insights.append({
-                        "entry_id": entry["id"],
-                        "date": entry["created_at"].isoformat() if hasattr(entry["created_at"], 'isoformat') else str(entry["created_at"]),
-                        "title": entry.get("title", "Untitled Entry"),
-                        "sentiment_score": insights.get("sentiment_score", 0.5),
-                        "dominant_emotion": insights["emotions"][0]["emotion"] if insights.get("emotions") and len(insights["emotions"]) > 0 else "neutral",
-                        "main_theme": insights["themes"][0]["theme"] if insights.get("themes") and len(insights["themes"]) > 0 else "reflection"
-                    })
-                except (ValueError, RuntimeError) as e:
-                    print(f"Error analyzing entry {entry['id']}: {e}")
-                    analysis_errors.append(f"Entry '{entry.get('title', 'Untitled')}': {str(e)}")
-                    # Skip entries that can't be analyzed instead of adding fake data
-
-        # If all entries failed analysis, return error
-        if len(entries) > 0 and len(recent_insights) == 0:
-            error_details = "; ".join(analysis_errors[:3])  # Show first 3 errors
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unable to analyze any journal entries. Issues: {error_details}"
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+
+        async def build_dashboard():
+            # Get journal entries
+            entries = await asyncio.to_thread(memory_service.list_journal_entries, clerk_user_id, limit=30)
+
+            # Basic statistics
+            now = datetime.now()
+            cutoff_week = now - timedelta(days=7)
+            cutoff_month = now - timedelta(days=30)
+            created = created_at_array(entries, now)
+
+            stats = {
+                "total_entries": len(entries),
+                "entries_this_week": int(np.count_nonzero(created >= np.datetime64(cutoff_week))),
+                "entries_this_month": int(np.count_nonzero(created >= np.datetime64(cutoff_month)))
+            }
+
+            # Run trend analysis and per-entry insights for the most recent entries concurrently
+            recent_entries = [e for e in entries[:5] if e.get("id") is not None]  # Last 5 entries
+            trends, entry_results = await asyncio.gather(
+                vector_insights_service.analyze_trends_fast([dict(e) for e in entries[:10]]),
+                vector_insights_service.batch_analyze_cached(recent_entries, clerk_user_id),
+                return_exceptions=True,
             )
-
-        return {
-            "statistics": stats,
-            "trends": trends,
-            "recent_insights": recent_insights,
-            "generated_at": datetime.now()
-        }
-
+            if isinstance(trends, (ValueError, RuntimeError)):
+                raise HTTPException(status_code=400, detail=f"Trend analysis failed: {str(trends)}")
+            if isinstance(trends, BaseException):
+                raise trends
+
+            # Get insights for most recent entries
+            recent_insights = []
+            analysis_errors = []
+
+            for entry, insights in zip(recent_entries, entry_results):
+                if isinstance(insights, (ValueError, RuntimeError)):
+                    print(f"Error analyzing entry {entry['id']}: {insights}")
+                    analysis_errors.append(f"Entry '{entry.get('title', 'Untitled')}': {str(insights)}")
+                    # Skip entries that can't be analyzed instead of adding fake data
+                    continue
+                if isinstance(insights, BaseException):
+                    raise insights
+                recent_insights.append({
+                    "entry_id": entry["id"],
+                    "date": entry["created_at"],
+                    "title": entry.get("title", "Untitled Entry"),
+                    "sentiment_score": insights.get("sentiment_score", 0.5),
+                    "dominant_emotion": insights["emotions"][0]["emotion"] if insights.get("emotions") and len(insights["emotions"]) > 0 else "neutral",
+                    "main_theme": insights["themes"][0]["theme"] if insights.get("themes") and len(insights["themes"]) > 0 else "reflection"
+                })
+
+            # If all entries failed analysis, return error
+            if len(entries) > 0 and len(recent_insights) == 0:
+                error_details = "; ".join(analysis_errors[:3])  # Show first 3 errors
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unable to analyze any journal entries. Issues: {error_details}"
+                )
+
+            return {
+                "statistics": stats,
+                "trends": trends,
+                "recent_insights": recent_insights,
+                "generated_at": now
+            }
+
+        return await cached_insights_response(clerk_user_id, ("dashboard",), build_dashboard)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Dashboard error: {str(e)}")
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
 # --- New: Journal edit/delete endpoints ---
-from typing import Optional
 
 class JournalUpdate(BaseModel):
     title: Optional[str] = None
@@ -582,21 +627,16 @@ class JournalUpdate(BaseModel):
 
 @app.patch("/journal/{entry_id}")
 async def update_journal(entry_id: int, payload: JournalUpdate, clerk_user_id: str = Depends(get_current_user_id)):
-    memory_service.ensure_user(clerk_user_id)
-    ok = memory_service.update_journal_entry(clerk_user_id, entry_id, title=payload.title, content=payload.content)
-    if not ok:
-        raise HTTPException(status_code=404, detail="Journal entry not found or not updated")
-    # Return updated item
-    items = memory_service.list_journal_entries(clerk_user_id, limit=100)
-    entry = next((e for e in items if e["id"] == entry_id), None)
+    await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+    entry = await asyncio.to_thread(memory_service.update_journal_entry, clerk_user_id, entry_id, title=payload.title, content=payload.content)
     if not entry:
-        raise HTTPException(status_code=404, detail="Journal entry not found after update")
+        raise HTTPException(status_code=404, detail="Journal entry not found or not updated")
     return entry
 
 @app.delete("/journal/{entry_id}")
 async def delete_journal(entry_id: int, clerk_user_id: str = Depends(get_current_user_id)):
-    memory_service.ensure_user(clerk_user_id)
-    ok = memory_service.delete_journal_entry(clerk_user_id, entry_id)
+    await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+    ok = await asyncio.to_thread(memory_service.delete_journal_entry, clerk_user_id, entry_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Journal entry not found")
     return {"success": True}
@@ -607,13 +647,13 @@ class GoalsPayload(BaseModel):
 
 @app.get("/user/goals")
 async def get_goals(clerk_user_id: str = Depends(get_current_user_id)):
-    memory_service.ensure_user(clerk_user_id)
-    return {"goals": memory_service.get_user_goals(clerk_user_id)}
+    await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+    return {"goals": await asyncio.to_thread(memory_service.get_user_goals, clerk_user_id)}
 
 @app.put("/user/goals")
 async def put_goals(payload: GoalsPayload, clerk_user_id: str = Depends(get_current_user_id)):
-    memory_service.ensure_user(clerk_user_id)
-    ok = memory_service.set_user_goals(clerk_user_id, payload.goals or [])
+    await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
+    ok = await asyncio.to_thread(memory_service.set_user_goals, clerk_user_id, payload.goals or [])
     if not ok:
         raise HTTPException(status_code=500, detail="Failed to save goals")
     return {"success": True}
@@ -621,10 +661,9 @@ async def put_goals(payload: GoalsPayload, clerk_user_id: str = Depends(get_curr
 # (Removed) User settings endpoints; local-only mode deprecated in favor of PII sanitization
 
 # --- New: Weekly/Monthly summary endpoint ---
-class Period(str):
-    pass
-
 class SummaryResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     period: str
     summary: Dict[str, Any]
     generated_at: datetime
@@ -633,29 +672,12 @@ class SummaryResponse(BaseModel):
 async def get_period_summary(period: str = "week", clerk_user_id: str = Depends(get_current_user_id)):
     """Generate a concise weekly/monthly reflection summary."""
     try:
-        memory_service.ensure_user(clerk_user_id)
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
         # Use existing entries and trends to craft a summary
-        entries = memory_service.list_journal_entries(clerk_user_id, limit=60)
-        # Select period window
+        # Select period window (filtered in SQL)
         now = datetime.now()
         window = 7 if period == "week" else 30
-
-        def safe_dt(v):
-            if isinstance(v, str):
-                try:
-                    return datetime.fromisoformat(v.replace('Z', '+00:00'))
-                except:
-                    return now
-            if hasattr(v, 'year'):
-                return v
-            return now
-
-        recent = []
-        for e in entries:
-            dt_val = e.get("created_at")
-            created = safe_dt(dt_val) if dt_val is not None else now
-            if (now - created) <= timedelta(days=window):
-                recent.append(e)
+        recent = await asyncio.to_thread(memory_service.list_entries_since, clerk_user_id, now - timedelta(days=window), limit=60)
         trends = await vector_insights_service.analyze_trends_fast([dict(e) for e in recent])
         # Build summary object
         top_themes = ", ".join([t.get("theme", "").replace('_', ' ') for t in trends.get("dominant_themes", [])[:3]]) or "varied topics"
@@ -670,25 +692,44 @@ async def get_period_summary(period: str = "week", clerk_user_id: str = Depends(
             "highlights": [trends.get("insights_summary", "")],
             "suggestions": recs,
         }
-        return SummaryResponse(period=period, summary=summary, generated_at=datetime.now())
+        return SummaryResponse(period=period, summary=summary, generated_at=now)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Summary error: {str(e)}")
 
 # --- New: User data export endpoint ---
 @app.get("/export")
-async def export_user_data(download: bool = False, clerk_user_id: str = Depends(get_current_user_id)):
+async def export_user_data(download: bool = False, stream: bool = False, clerk_user_id: str = Depends(get_current_user_id)):
     """Export the user's data (journals and goals) as JSON.
 
     - Set download=true to suggest a file download in browsers.
+    - Set stream=true for NDJSON instead: a {"kind": "goals"} line, then one {"kind": "journal"}
+      line per entry, streamed from the database without building the whole export in memory,
+      and a final {"kind": "end", "journal_count": n} line; an export without it was cut off.
     Conversations are not retained and will be an empty list in the payload for compatibility.
     """
     try:
-        memory_service.ensure_user(clerk_user_id)
-        data = memory_service.export_user_data(clerk_user_id)
+        await asyncio.to_thread(memory_service.ensure_user, clerk_user_id)
         headers = {}
         if download:
-            filename = f"keo-export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+            extension = "ndjson" if stream else "json"
+            filename = f"keo-export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
             headers["Content-Disposition"] = f"attachment; filename={filename}"
-        return JSONResponse(content=data, headers=headers)
+        if stream:
+            rows = memory_service.iter_export_rows(clerk_user_id)
+            return StreamingResponse((orjson.dumps(row) + b"\n" for row in rows), media_type="application/x-ndjson", headers=headers)
+        data = await asyncio.to_thread(memory_service.export_user_data, clerk_user_id)
+        return ORJSONResponse(content=data, headers=headers)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Export error: {str(e)}")
+
+if __name__ == "__main__":
+    import uvicorn
+    # uvicorn[standard] brings uvloop + httptools, which uvicorn picks automatically.
+    # Workers need an import string; each one imports main and builds its own DB pool.
+    # A small fixed default: the DB pool is split across workers, and a streaming export holds
+    # one of a worker's connections for the whole download
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY") or 2))
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    # Keep idle connections open long enough for the SPA's bursts of API calls to reuse them
+    keep_alive = int(os.getenv("KEEP_ALIVE_TIMEOUT", "75"))
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers, timeout_keep_alive=keep_alive)
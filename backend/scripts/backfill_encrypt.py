@@ -17,32 +17,48 @@ import argparse
 import base64
 import os
 import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
 # Ensure we can import services.crypto_utils when run from repo root
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from services.crypto_utils import encrypt_text_for_user  # type: ignore
+from services.crypto_utils import derive_user_key, encrypt_many, encrypt_with_key  # type: ignore
+
+
+# Rows fetched per round-trip from the server-side cursor, and rows per batched UPDATE
+BATCH_SIZE = 500
+# Users backfilled per transaction; fewer commits means fewer WAL flushes, and a failed
+# batch is simply redone on the next (idempotent) run
+USERS_PER_COMMIT = 50
 
 
 def is_encrypted(value: str) -> bool:
-    """Heuristic: base64-decode and check for KEO1 prefix bytes."""
+    """Heuristic: check for the KEO1 prefix bytes.
+
+    Base64 maps every 4 chars to 3 bytes, so the first 8 chars are enough to
+    recover the prefix without decoding the whole (possibly large) value.
+    """
+    # KEO1 + 12-byte nonce + 16-byte tag can't encode to fewer than 44 chars, and padded
+    # base64 is always a multiple of 4 long, which most plaintext isn't
+    if len(value) < 44 or len(value) % 4:
+        return False
     try:
-        raw = base64.b64decode(value)
-        return len(raw) > 16 and raw.startswith(b"KEO1")
+        raw = base64.b64decode(value[:8], validate=False)
+        return raw[:4] == b"KEO1"
     except Exception:
         return False
 
 
-def connect():
+def connect_pool(max_connections: int) -> ThreadedConnectionPool:
     url = os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL is required")
-    return psycopg2.connect(url)
+    return ThreadedConnectionPool(1, max_connections, url)
 
 
 def list_users(conn, only_user: str | None):
@@ -56,51 +72,81 @@ def list_users(conn, only_user: str | None):
     return rows
 
 
-def backfill_user(conn, clerk_user_id: str) -> tuple[int, int]:
+def _encrypt_chunk(args: tuple) -> list[tuple]:
+    """Worker: encrypt one user's (id, title, content) rows into UPDATE tuples with one encrypt_many call."""
+    key, clerk_user_id, rows = args
+    flat = encrypt_many(key, [value for _, title, content in rows for value in (title, content)])
+    return [(flat[2 * i], flat[2 * i + 1], jid, clerk_user_id) for i, (jid, _, _) in enumerate(rows)]
+
+
+def encrypt_rows(key: bytes, clerk_user_id: str, rows: list[tuple], executor: Executor | None, workers: int = 1) -> list[tuple]:
+    """Encrypt a batch of rows, split into chunks across the executor's `workers` processes when given one."""
+    if executor is None or len(rows) < 2:
+        return _encrypt_chunk((key, clerk_user_id, rows))
+    workers = max(1, workers)
+    size = max(1, -(-len(rows) // (workers * 4)))
+    chunks = [(key, clerk_user_id, rows[i:i + size]) for i in range(0, len(rows), size)]
+    return [update for part in executor.map(_encrypt_chunk, chunks) for update in part]
+
+
+def flush_journal_updates(cur, updates: list[tuple]) -> int:
+    """Apply (title, content, id, clerk_user_id) ciphertext rows in one UPDATE ... FROM (VALUES ...)."""
+    if not updates:
+        return 0
+    execute_values(
+        cur,
+        """
+        UPDATE journal_entries AS j
+        SET title = v.title, content = v.content, updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v(title, content, id, clerk_user_id)
+        WHERE j.id = v.id AND j.clerk_user_id = v.clerk_user_id
+        """,
+        updates,
+        page_size=BATCH_SIZE,
+    )
+    return len(updates)
+
+
+def backfill_user(conn, clerk_user_id: str, executor: Executor | None = None, workers: int = 1) -> tuple[int, int]:
     """Return (journal_updates, goals_updates)."""
     j_updates = 0
     g_updates = 0
+    # Derive the user's key once; every row below reuses it instead of re-running HKDF
+    key = derive_user_key(clerk_user_id)
+    if key is None:
+        raise RuntimeError(f"could not derive encryption key for {clerk_user_id}")
 
-    # Journal entries
+    # Journal entries: stream through a server-side cursor and flush every BATCH_SIZE rows,
+    # so memory stays bounded no matter how many entries the user has
     cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(
+    read_cur = conn.cursor(name="jbackfill", cursor_factory=RealDictCursor)
+    read_cur.itersize = BATCH_SIZE
+    read_cur.execute(
         """
         SELECT id, title, content FROM journal_entries
         WHERE clerk_user_id = %s
         """,
         (clerk_user_id,),
     )
-    rows = cur.fetchall() or []
-    for r in rows:
-        jid = r["id"]
-        title = r.get("title")
+    pending = []
+    for r in read_cur:
         content = r.get("content") or ""
         # Skip if content looks encrypted
         if isinstance(content, str) and is_encrypted(content):
             continue
-        enc_title = encrypt_text_for_user(clerk_user_id, title) if title is not None else None
-        enc_content = encrypt_text_for_user(clerk_user_id, content)
-        cur2 = conn.cursor()
-        cur2.execute(
-            """
-            UPDATE journal_entries
-            SET title = %s, content = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s AND clerk_user_id = %s
-            """,
-            (enc_title, enc_content, jid, clerk_user_id),
-        )
-        cur2.close()
-        j_updates += 1
-    cur.close()
+        pending.append((r["id"], r.get("title"), content))
+        if len(pending) >= BATCH_SIZE:
+            j_updates += flush_journal_updates(cur, encrypt_rows(key, clerk_user_id, pending, executor, workers))
+            pending = []
+    j_updates += flush_journal_updates(cur, encrypt_rows(key, clerk_user_id, pending, executor, workers))
+    read_cur.close()
 
     # User goals
-    cur = conn.cursor(cursor_factory=RealDictCursor)
     cur.execute("SELECT goals_json FROM user_goals WHERE clerk_user_id = %s", (clerk_user_id,))
     row = cur.fetchone()
     if row and (gj := row.get("goals_json")) and isinstance(gj, str) and not is_encrypted(gj):
-        enc = encrypt_text_for_user(clerk_user_id, gj)
-        cur2 = conn.cursor()
-        cur2.execute(
+        enc = encrypt_with_key(key, gj)
+        cur.execute(
             """
             UPDATE user_goals
             SET goals_json = %s, updated_at = CURRENT_TIMESTAMP
@@ -108,13 +154,32 @@ def backfill_user(conn, clerk_user_id: str) -> tuple[int, int]:
             """,
             (enc, clerk_user_id),
         )
-        cur2.close()
         g_updates = 1
     cur.close()
 
     return j_updates, g_updates
 
 
+def backfill_users(pool: ThreadedConnectionPool, users: list[str], executor: Executor | None, workers: int = 1) -> tuple[int, int]:
+    """Backfill a batch of users on one pooled connection, committed as a single transaction."""
+    conn = pool.getconn()
+    try:
+        total_j = 0
+        total_g = 0
+        for u in users:
+            j, g = backfill_user(conn, u, executor, workers)
+            total_j += j
+            total_g += g
+            print(f"✓ {u}: journals updated={j}, goals updated={g}")
+        conn.commit()
+        return total_j, total_g
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
 def main():
     if not os.getenv("DATA_ENCRYPTION_SECRET"):
         print("ERROR: DATA_ENCRYPTION_SECRET is not set; cannot encrypt. Export it and retry.")
@@ -122,22 +187,47 @@ def main():
 
     parser = argparse.ArgumentParser(description="Encrypt plaintext journals/goals in-place.")
     parser.add_argument("--user", dest="user", help="Optional Clerk user id to limit backfill", default=None)
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=1,
+        help="Encryption worker processes (default: 1, encrypts inline)",
+    )
+    parser.add_argument(
+        "--connections",
+        dest="connections",
+        type=int,
+        default=8,
+        help="Database connections working on different users at once (default: 8)",
+    )
     args = parser.parse_args()
+    connections = max(1, args.connections)
+    workers = max(1, args.workers)
 
-    conn = connect()
+    pool = connect_pool(connections)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
     try:
-        users = list_users(conn, args.user)
+        conn = pool.getconn()
+        try:
+            users = list_users(conn, args.user)
+        finally:
+            pool.putconn(conn)
+        # Spread users over the connections so their reads and commits overlap, but never
+        # put more than USERS_PER_COMMIT users in one transaction
+        per_batch = max(1, min(USERS_PER_COMMIT, -(-len(users) // connections)))
+        batches = [users[i:i + per_batch] for i in range(0, len(users), per_batch)]
         total_j = 0
         total_g = 0
-        for u in users:
-            j, g = backfill_user(conn, u)
-            conn.commit()
-            total_j += j
-            total_g += g
-            print(f"✓ {u}: journals updated={j}, goals updated={g}")
+        with ThreadPoolExecutor(max_workers=connections) as threads:
+            for j, g in threads.map(lambda batch: backfill_users(pool, batch, executor, workers), batches):
+                total_j += j
+                total_g += g
         print(f"Done. Total journals updated={total_j}, goals updated={total_g}")
     finally:
-        conn.close()
+        if executor is not None:
+            executor.shutdown()
+        pool.closeall()
 
 
 if __name__ == "__main__":
@@ -10,12 +10,49 @@ Usage (local):
 Matches schema used by MemoryService; safe to re-run (cleans prior data for this user).
 """
 from __future__ import annotations
+import csv
+import io
 import os
 from datetime import datetime, timedelta, time, date
 import psycopg2
 
 USER_ID = "user_32D1gkVrs6uaWWPxOXJTJjNzUJ8"
 
+# Entry text for the current streak, by weekday (Mon=0..Sun=6)
+CURRENT_STREAK_BASES = {
+    6: "Sunday reflections with family brunch and gratitude. Felt calm and present. Practiced mindfulness and a short walk.",
+    0: "Monday brought work stress and deadlines. Practiced breathing, took a mindful break. Anxiety noticeable but manageable.",
+    1: "Focused deep work and learning new skills. Coffee helped; mood positive, productive, and optimistic about goals.",
+    2: "Midweek fatigue due to poor sleep. Tension in shoulders; tried a nap and meditation to reset.",
+    3: "Gym workout and evening reading. Energy improved. Feeling grateful and grounded after exercise.",
+    4: "Time with friends. Laughter, joy, and connection. Low stress today and strong sense of support.",
+    5: "Long run in the park and reflective journaling. Planning next week with intention and self-compassion.",
+}
+CURRENT_STREAK_KEYWORDS = " Keywords: work, stress, sleep, exercise, gratitude, family, friends, anxiety, meditation, running."
+
+# Earlier best streak: shared intro plus one of three add-ons (weekday % 3)
+EARLIER_STREAK_INTRO = (
+    "Earlier streak focus on healthy routines: consistent sleep, daily exercise, and evening gratitude journaling. "
+)
+EARLIER_STREAK_ADDONS = (
+    "Work felt manageable; stress reduced after walks and better boundaries.",
+    "Energy steady; enjoyed reading and meditation; anxiety noticeably lower.",
+    "Improved mood and productivity; kept present with mindful breaks and deep breathing.",
+)
+EARLIER_STREAK_KEYWORDS = " Keywords: routine, exercise, sleep, gratitude, mindfulness, boundaries, learning."
+
+# Scattered older entries, by weekday
+SCATTERED_BASES = {
+    6: "Weekend hike and nature therapy. Gratitude for family time and recovery sleep.",
+    0: "Challenging meeting increased stress; practiced breathing and set priorities.",
+    1: "Solid workout and protein-rich meals; mood stable and focused on learning.",
+    2: "Rest day; noticed rumination and redirected with a mindful pause.",
+    3: "Progress on side project; reading before bed improved sleep quality.",
+    4: "Dinner with friends; joyful connection and laughter; low anxiety.",
+    5: "Long walk listening to music; journaling and planning manageable goals.",
+}
+SCATTERED_KEYWORDS = " Keywords: planning, gratitude, stress, anxiety, exercise, sleep, friends, family, learning, walking."
+
 
 def connect():
     url = os.getenv("DATABASE_URL")
@@ -46,6 +83,14 @@ def ensure_schema(cur):
         );
         """
     )
+    # Same index MemoryService creates; its clerk_user_id prefix also serves the
+    # per-user DELETE/SELECT/UPDATE in the seed and backfill scripts
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_je_user_created
+        ON journal_entries (clerk_user_id, created_at DESC);
+        """
+    )
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS user_goals (
@@ -70,8 +115,16 @@ def seed_user(conn):
     )
     # Clean old data
     # Conversations are not retained
-    cur.execute("DELETE FROM journal_entries WHERE clerk_user_id = %s", (USER_ID,))
-    cur.execute("DELETE FROM user_goals WHERE clerk_user_id = %s", (USER_ID,))
+    # One statement clears both tables (a data-modifying CTE runs even when unreferenced)
+    cur.execute(
+        """
+        WITH deleted_entries AS (
+          DELETE FROM journal_entries WHERE clerk_user_id = %s
+        )
+        DELETE FROM user_goals WHERE clerk_user_id = %s
+        """,
+        (USER_ID, USER_ID),
+    )
 
     # Goals
     cur.execute(
@@ -88,63 +141,29 @@ def seed_user(conn):
     )
 
     today = date.today()
+    # Entries are collected here and bulk-loaded with a single COPY below
+    rows: list[tuple] = []
 
     def insert_entry(d: date, t: time, title: str, content: str):
         dt = datetime.combine(d, t)
-        cur.execute(
-            """
-            INSERT INTO journal_entries (clerk_user_id, title, content, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (USER_ID, title, content, dt, dt),
-        )
+        rows.append((USER_ID, title, content, dt, dt))
 
     # Current streak: 10 days up to today
     for offs in range(0, 10):
         d = today - timedelta(days=offs)
-        dow = d.weekday()  # Mon=0..Sun=6
-        base = {
-            6: "Sunday reflections with family brunch and gratitude. Felt calm and present. Practiced mindfulness and a short walk.",
-            0: "Monday brought work stress and deadlines. Practiced breathing, took a mindful break. Anxiety noticeable but manageable.",
-            1: "Focused deep work and learning new skills. Coffee helped; mood positive, productive, and optimistic about goals.",
-            2: "Midweek fatigue due to poor sleep. Tension in shoulders; tried a nap and meditation to reset.",
-            3: "Gym workout and evening reading. Energy improved. Feeling grateful and grounded after exercise.",
-            4: "Time with friends. Laughter, joy, and connection. Low stress today and strong sense of support.",
-            5: "Long run in the park and reflective journaling. Planning next week with intention and self-compassion.",
-        }[dow]
-        content = base + " Keywords: work, stress, sleep, exercise, gratitude, family, friends, anxiety, meditation, running."
+        content = CURRENT_STREAK_BASES[d.weekday()] + CURRENT_STREAK_KEYWORDS
         insert_entry(d, time(9, 30), f"Journal Entry - {d}", content)
 
     # Earlier best streak: 15 consecutive days ~60..46 days ago
     for offs in range(46, 61):
         d = today - timedelta(days=offs)
-        mod = (d.weekday() % 3)
-        addon = (
-            "Work felt manageable; stress reduced after walks and better boundaries." if mod == 0 else
-            "Energy steady; enjoyed reading and meditation; anxiety noticeably lower." if mod == 1 else
-            "Improved mood and productivity; kept present with mindful breaks and deep breathing."
-        )
-        content = (
-            "Earlier streak focus on healthy routines: consistent sleep, daily exercise, and evening gratitude journaling. "
-            + addon
-            + " Keywords: routine, exercise, sleep, gratitude, mindfulness, boundaries, learning."
-        )
+        content = EARLIER_STREAK_INTRO + EARLIER_STREAK_ADDONS[d.weekday() % 3] + EARLIER_STREAK_KEYWORDS
         insert_entry(d, time(8, 45), f"Journal Entry - {d}", content)
 
     # Scattered entries 80..120 days ago, every 3 days
     for offs in range(80, 121, 3):
         d = today - timedelta(days=offs)
-        dow = d.weekday()
-        bases = {
-            6: "Weekend hike and nature therapy. Gratitude for family time and recovery sleep.",
-            0: "Challenging meeting increased stress; practiced breathing and set priorities.",
-            1: "Solid workout and protein-rich meals; mood stable and focused on learning.",
-            2: "Rest day; noticed rumination and redirected with a mindful pause.",
-            3: "Progress on side project; reading before bed improved sleep quality.",
-            4: "Dinner with friends; joyful connection and laughter; low anxiety.",
-            5: "Long walk listening to music; journaling and planning manageable goals.",
-        }
-        content = bases.get(dow, bases[5]) + " Keywords: planning, gratitude, stress, anxiety, exercise, sleep, friends, family, learning, walking."
+        content = SCATTERED_BASES[d.weekday()] + SCATTERED_KEYWORDS
         insert_entry(d, time(19, 15), f"Journal Entry - {d}", content)
 
     # A day with two entries to test aggregation
@@ -152,6 +171,19 @@ def seed_user(conn):
     insert_entry(d, time(8, 0), "Morning reflections - dual entry test", "Short note: gratitude for coffee and quiet time. Light exercise planned. Keywords: gratitude, coffee, quiet, exercise.")
     insert_entry(d, time(20, 30), "Evening wrap-up - dual entry test", "Evening check-in: a bit of stress, managed with a walk and deep breathing. Keywords: stress, walk, breathing.")
 
+    # CSV quoting handles commas, quotes and newlines in content; None is written
+    # as an unquoted empty field, which COPY reads back as NULL
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(
+        """
+        COPY journal_entries (clerk_user_id, title, content, created_at, updated_at)
+        FROM STDIN WITH (FORMAT csv)
+        """,
+        buf,
+    )
+
     # Conversations removed from seed data
 
     conn.commit()
@@ -1,17 +1,110 @@
 import os
-from typing import List, Optional, AsyncGenerator
-import httpx
-import json
+import time
+import hashlib
+from typing import Dict, List, Optional, AsyncGenerator, Set, Tuple
+import orjson
 import re
 import random
+import threading
+
+from .http_client import get_client
+
+try:
+    import hyperscan  # Optional: one SIMD pass tells _sanitize_text which PII passes can match
+except ImportError:
+    hyperscan = None
+
+# PII patterns masked by AIService._sanitize_text, compiled once at import. The phone and
+# address patterns open with a lookahead on their first character so the scan rejects
+# most positions before trying the optional groups and word-boundary checks.
+_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@([A-Za-z0-9.-]+)\.[A-Za-z]{2,}")
+_PHONE_RE = re.compile(r"(?=[+(\d])\b(?:\+?\d{1,3}[\s-]?)?(?:\(\d{3}\)|\d{3})[\s-]?\d{3}[\s-]?\d{4}\b")
+_NAME_RE = re.compile(r"[\[<]([A-Z][a-z]{1,20})[>\]]")
+_DIGIT_RE = re.compile(r"\d")
+_ADDRESS_RE = re.compile(r"(?=\d)\b\d{1,5}\s+\w+\s+(Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr)\b", re.IGNORECASE)
+_PII_PATTERNS = (_EMAIL_RE, _PHONE_RE, _NAME_RE, _ADDRESS_RE)
+
+
+def _build_pii_prefilter():
+    """Compile _PII_PATTERNS into a Hyperscan database, or return None when it isn't installed.
+
+    Prefilter mode only promises to match a superset of what each pattern matches, so it
+    decides which re passes to run; the replacements themselves still come from re.
+    """
+    if hyperscan is None:
+        return None
+    try:
+        base_flags = hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+        db = hyperscan.Database()
+        # Python's \s also covers the \x1c-\x1f separators, which Hyperscan's Unicode \s doesn't
+        expressions = [
+            p.pattern.replace(r"[\s-]", r"[\s\x1c-\x1f-]").replace(r"\s+", r"[\s\x1c-\x1f]+").encode("utf-8")
+            for p in _PII_PATTERNS
+        ]
+        db.compile(
+            expressions=expressions,
+            ids=list(range(len(_PII_PATTERNS))),
+            elements=len(_PII_PATTERNS),
+            flags=[base_flags | (hyperscan.HS_FLAG_CASELESS if p.flags & re.IGNORECASE else 0) for p in _PII_PATTERNS],
+        )
+        return db
+    except Exception as e:
+        print(f"Hyperscan PII prefilter unavailable, using re only: {e}")
+        return None
 
-class AIService:
-    def __init__(self):
-        self.api_key = os.getenv("ANTHROPIC_API_KEY")
-        self.base_url = "https://api.anthropic.com/v1/messages"
-        
-        # Updated and more robust system prompt
-        self.system_prompt = """You are an empathetic AI called Keo, a journaling companion. Your primary role is to create a safe, non-judgmental space for the user to explore their thoughts and feelings.
+
+_PII_PREFILTER = _build_pii_prefilter()
+# The database owns a single scratch space, so scans must not overlap
+_PII_PREFILTER_LOCK = threading.Lock()
+
+
+def _pii_candidates(text: str) -> Optional[Set[int]]:
+    """Indexes into _PII_PATTERNS that may match text, or None when there is no prefilter."""
+    if _PII_PREFILTER is None:
+        return None
+    hits: Set[int] = set()
+
+    def on_match(pattern_id, start, end, flags, context):
+        hits.add(pattern_id)
+
+    try:
+        with _PII_PREFILTER_LOCK:
+            _PII_PREFILTER.scan(text.encode("utf-8"), match_event_handler=on_match)
+    except Exception:
+        return None
+    return hits
+
+
+def _mask_pii(text: str) -> str:
+    """The masking behind AIService._sanitize_text."""
+    t = text
+    # With Hyperscan installed, one scan rules out the patterns that can't match
+    hits = _pii_candidates(t)
+    if hits is not None and not hits:
+        return t
+    # Each pass is skipped when the text lacks a character its pattern requires;
+    # a substring check is far cheaper than a regex scan that finds nothing
+    # Emails
+    if "@" in t and (hits is None or 0 in hits):
+        masked = _EMAIL_RE.sub("[email]", t)
+        if masked != t and hits is not None:
+            # "[email]" can open a word boundary the original text lacked ("a@b.comx555-123-4567"),
+            # so the prefilter's verdict on the later patterns no longer holds; rescan
+            hits = _pii_candidates(masked)
+        t = masked
+    # Phone numbers (simple patterns) and addresses (very rough street patterns) need digits
+    if _DIGIT_RE.search(t):
+        if hits is None or 1 in hits:
+            t = _PHONE_RE.sub("[phone]", t)
+        if hits is None or 3 in hits:
+            t = _ADDRESS_RE.sub("[address]", t)
+    # Names in brackets like [John], <John>
+    if ("[" in t or "<" in t) and (hits is None or 2 in hits):
+        t = _NAME_RE.sub("[name]", t)
+    return t
+
+# Updated and more robust system prompt
+_SYSTEM_PROMPT = """You are an empathetic AI called Keo, a journaling companion. Your primary role is to create a safe, non-judgmental space for the user to explore their thoughts and feelings.
 
 Your Role as Keo:
 1.  **Listen Actively:** Provide thoughtful, validating, and non-judgmental responses that show you understand.
@@ -43,138 +136,270 @@ You are not a therapist, doctor, or crisis counselor. Your duty is to act respon
     -   **DO NOT** attempt to "talk them down" or explore the reasons for these feelings. Your ONLY priority is to guide them to real, human help.
 """
 
+# System prompt for generate_opening_prompt's narrower task
+_OPENING_SYSTEM_PROMPT = "You are Keo, an empathetic AI journaling companion. Your task is to generate warm, personal opening messages based on a user's journal history. Always maintain a supportive, safe, and non-triggering tone."
+
+# Opening prompts for users with no entries yet
+_DEFAULT_OPENING_PROMPTS = (
+    "What's been on your mind lately?",
+    "How are you feeling today?",
+    "What's one thing that stood out to you today?",
+    "I'm here to listen. What would you like to share?",
+    "What's bringing you here for reflection today?",
+)
+
+# Claude 3.5 Sonnet only caches prompt prefixes of 1024+ tokens; English prose runs about
+# 4 characters per token, so shorter prefixes are sent without a cache_control marker
+_MIN_CACHEABLE_PREFIX_CHARS = 4 * 1024
+
+# Static fragments of the per-request prompts; only the user's text is filled in per call
+_MEMORIES_HEADER = "\n\nRelevant conversation history:\n"
+_GOALS_HEADER = "\n\nUser focus areas/goals: "
+_PROMPT_HEADER = "User message: "
+_PROMPT_FOOTER = "\n\nPlease respond as Keo, the empathetic journaling companion, following all your core instructions and safety protocols."
+_OPENING_HEADER = "Recent journal entries:\n"
+_OPENING_GOALS_HEADER = "\n\nUser goals to keep in mind: "
+_OPENING_INSTRUCTIONS = """
+
+Based on the user's recent journal entries, craft a warm, empathetic opening message that:
+1.  Acknowledges themes or emotions from recent entries without being overly specific.
+2.  Shows you remember what they've shared.
+3.  Asks a thoughtful, gentle follow-up question to continue the conversation.
+4.  Keeps it concise (1-2 sentences).
+
+Examples:
+- "I remember you mentioned feeling overwhelmed at work. How are things looking today?"
+- "It sounds like you've been processing a lot lately. What's on your mind right now?"
+
+Respond only with the opening message itself, nothing else."""
+
+
+class AIService:
+    def __init__(self):
+        self.api_key = os.getenv("ANTHROPIC_API_KEY")
+        self.base_url = "https://api.anthropic.com/v1/messages"
+        # Recent replies keyed by a hash of the user and the normalized prompt (see _response_cache_key)
+        self._response_cache: Dict[str, Tuple[float, str]] = {}
+        self._response_cache_max = 1024
+        try:
+            self._response_cache_ttl = int(os.getenv("CHAT_CACHE_TTL_SECONDS", "600"))
+        except Exception:
+            self._response_cache_ttl = 600
+        # Recently sanitized texts: plaintext -> (time, masked). The same recent entries come
+        # back every chat turn; the TTL keeps decrypted journal text from lingering in memory.
+        self._sanitize_cache: Dict[str, Tuple[float, str]] = {}
+        self._sanitize_cache_lock = threading.Lock()
+        self._sanitize_cache_max = 8192
+        try:
+            self._sanitize_cache_ttl = int(os.getenv("SANITIZE_CACHE_TTL_SECONDS", "300"))
+        except Exception:
+            self._sanitize_cache_ttl = 300
+        
+        self.system_prompt = _SYSTEM_PROMPT
+        # Memory/goal context blocks sent recently: hash -> last send time. A block is marked
+        # for Anthropic prompt caching (together with the system prompt ahead of it) only when
+        # it repeats within the cache lifetime and the prefix is long enough to be cached, so a
+        # context that changes every turn never pays the cache-write premium.
+        self._context_seen: Dict[str, float] = {}
+        self._context_seen_max = 1024
+        self._prompt_cache_ttl = 300
+
+        # Static parts of each Messages API request, built once; calls only add "messages"
+        self._headers = {
+            "Content-Type": "application/json",
+            "X-API-Key": self.api_key,
+            "anthropic-version": "2023-06-01"
+        }
+        self._stream_headers = {
+            **self._headers,
+            "anthropic-beta": "messages-2023-12-15" # Recommended for streaming
+        }
+        self._response_payload = {
+            # Note: 'claude-sonnet-4-20250514' is a hypothetical future model name.
+            # Use a currently available model like 'claude-3-5-sonnet-20240620' or 'claude-3-sonnet-20240229'.
+            "model": "claude-3-5-sonnet-20240620",
+            "max_tokens": 1000,
+            "temperature": 0.7,
+            "system": self.system_prompt,
+        }
+        self._opening_payload = {
+            "model": "claude-3-5-sonnet-20240620",
+            "max_tokens": 200,
+            "temperature": 0.8,
+            "system": _OPENING_SYSTEM_PROMPT,
+        }
+
     def _sanitize_text(self, text: str) -> str:
         """Remove or mask common PII patterns from outgoing prompts."""
         if not text:
             return text
-        t = text
-        # Emails
-        t = re.sub(r"[A-Za-z0-9._%+-]+@([A-Za-z0-9.-]+)\.[A-Za-z]{2,}", "[email]", t)
-        # Phone numbers (simple patterns)
-        t = re.sub(r"\b(?:\+?\d{1,3}[\s-]?)?(?:\(\d{3}\)|\d{3})[\s-]?\d{3}[\s-]?\d{4}\b", "[phone]", t)
-        # Names in brackets like [John], <John>
-        t = re.sub(r"[\[<]([A-Z][a-z]{1,20})[>\]]", "[name]", t)
-        # Addresses (very rough street patterns)
-        t = re.sub(r"\b\d{1,5}\s+\w+\s+(Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr)\b", "[address]", t, flags=re.IGNORECASE)
-        return t
+        now = time.monotonic()
+        with self._sanitize_cache_lock:
+            # Dicts keep insertion order, so expired entries sit at the front
+            while self._sanitize_cache:
+                oldest = next(iter(self._sanitize_cache))
+                if now - self._sanitize_cache[oldest][0] <= self._sanitize_cache_ttl:
+                    break
+                del self._sanitize_cache[oldest]
+            cached = self._sanitize_cache.get(text)
+        if cached:
+            return cached[1]
+        masked = _mask_pii(text)
+        with self._sanitize_cache_lock:
+            self._sanitize_cache.pop(text, None)
+            if len(self._sanitize_cache) >= self._sanitize_cache_max:
+                self._sanitize_cache.pop(next(iter(self._sanitize_cache)))
+            self._sanitize_cache[text] = (now, masked)
+        return masked
 
-    async def generate_response(self, user_message: str, relevant_memories: List[str], user_goals: Optional[List[str]] = None) -> str:
-        try:
-            # Build context from memories
-            context = ""
-            if relevant_memories:
-                context = "\n\nRelevant conversation history:\n" + "\n".join([self._sanitize_text(m) for m in relevant_memories[:3]])
-            # Add goals context if provided
-            goals_text = ""
-            if user_goals:
-                goals_text = "\n\nUser focus areas/goals: " + ", ".join(user_goals[:5])
-            
-            # Create the prompt
-            user_prompt = f"""User message: {self._sanitize_text(user_message)}{context}{goals_text}
+    def _response_cache_key(self, clerk_user_id: Optional[str], user_message: str, context: str, goals_text: str) -> Optional[str]:
+        """Hash of the user and the prompt with only case and whitespace folded in the message,
+        so "I'm tired" and "i'm  TIRED" share a reply while punctuation and emoji still count;
+        memories and goals must match exactly. Replies are never shared between users.
+        None (don't cache) without a user or for a blank message."""
+        normalized = " ".join((user_message or "").casefold().split())
+        if not clerk_user_id or not normalized:
+            return None
+        return hashlib.sha256("\x1f".join((clerk_user_id, normalized, context, goals_text)).encode("utf-8")).hexdigest()
+
+    def _prompt_context(self, relevant_memories: List[str], user_goals: Optional[List[str]]) -> Tuple[str, str]:
+        """The sanitized memories block and the goals line of a chat prompt ("" when absent)."""
+        context = ""
+        if relevant_memories:
+            context = _MEMORIES_HEADER + "\n".join([self._sanitize_text(m) for m in relevant_memories[:3]])
+        goals_text = ""
+        if user_goals:
+            goals_text = _GOALS_HEADER + ", ".join(user_goals[:5])
+        return context, goals_text
 
-Please respond as Keo, the empathetic journaling companion, following all your core instructions and safety protocols."""
+    def _user_content(self, user_message: str, context: str, goals_text: str) -> List[Dict]:
+        """Content blocks for the user turn: the memory/goal context first, then the message.
 
-            headers = {
-                "Content-Type": "application/json",
-                "X-API-Key": self.api_key,
-                "anthropic-version": "2023-06-01"
-            }
+        Keeping the context ahead of the message lets a repeated context block be cached
+        together with the system prompt; the system prompt alone is below the minimum
+        cacheable prefix.
+        """
+        message_block = {"type": "text", "text": "".join((_PROMPT_HEADER, self._sanitize_text(user_message), _PROMPT_FOOTER))}
+        background = (context + goals_text).strip()
+        if not background:
+            return [message_block]
+        context_block: Dict = {"type": "text", "text": background}
+        now = time.monotonic()
+        digest = hashlib.sha256(background.encode("utf-8")).hexdigest()
+        last_sent = self._context_seen.pop(digest, None)
+        long_enough = len(self.system_prompt) + len(background) >= _MIN_CACHEABLE_PREFIX_CHARS
+        if long_enough and last_sent is not None and now - last_sent <= self._prompt_cache_ttl:
+            context_block["cache_control"] = {"type": "ephemeral"}
+        if len(self._context_seen) >= self._context_seen_max:
+            self._context_seen.pop(next(iter(self._context_seen)))
+        self._context_seen[digest] = now
+        return [context_block, message_block]
+
+    def _cached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        if cache_key is None:
+            return None
+        # A reply is replayed once (a retry or double submit); sending the same message
+        # again after that gets a fresh reply instead of the same canned text
+        cached = self._response_cache.pop(cache_key, None)
+        if cached and time.monotonic() - cached[0] <= self._response_cache_ttl:
+            return cached[1]
+        return None
+
+    def _remember_response(self, cache_key: Optional[str], text: str) -> None:
+        if cache_key is None:
+            return
+        self._response_cache.pop(cache_key, None)
+        if len(self._response_cache) >= self._response_cache_max:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            self._response_cache.pop(next(iter(self._response_cache)))
+        self._response_cache[cache_key] = (time.monotonic(), text)
+
+    async def generate_response(self, user_message: str, relevant_memories: List[str], user_goals: Optional[List[str]] = None, clerk_user_id: Optional[str] = None) -> str:
+        try:
+            # Build context from memories and goals
+            context, goals_text = self._prompt_context(relevant_memories, user_goals)
+
+            # Reuse this user's recent reply to an equivalent prompt instead of calling Claude again
+            cache_key = self._response_cache_key(clerk_user_id, user_message, context, goals_text)
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                return cached
             
-            data = {
-                # Note: 'claude-sonnet-4-20250514' is a hypothetical future model name.
-                # Use a currently available model like 'claude-3-5-sonnet-20240620' or 'claude-3-sonnet-20240229'.
-                "model": "claude-3-5-sonnet-20240620",
-                "max_tokens": 1000,
-                "temperature": 0.7,
-                "system": self.system_prompt,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ]
-            }
+            # Create the prompt
+            user_content = self._user_content(user_message, context, goals_text)
+            data = {**self._response_payload, "messages": [{"role": "user", "content": user_content}]}
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.base_url,
-                    headers=headers,
-                    json=data,
-                    timeout=30.0
-                )
+            client = get_client()
+            response = await client.post(
+                self.base_url,
+                headers=self._headers,
+                content=orjson.dumps(data),
+                timeout=30.0
+            )
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["content"][0]["text"]
-                else:
-                    print(f"API Error: {response.status_code} - {response.text}")
-                    return "I'm having trouble connecting right now. Could you try again?"
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                text = result["content"][0]["text"]
+                self._remember_response(cache_key, text)
+                return text
+            else:
+                print(f"API Error: {response.status_code} - {response.text}")
+                return "I'm having trouble connecting right now. Could you try again?"
             
         except Exception as e:
             print(f"Error generating AI response: {e}")
             return "I'm having trouble processing that right now. Could you try rephrasing your thoughts?"
 
-    async def generate_response_stream(self, user_message: str, relevant_memories: List[str], user_goals: Optional[List[str]] = None) -> AsyncGenerator[str, None]:
+    async def generate_response_stream(self, user_message: str, relevant_memories: List[str], user_goals: Optional[List[str]] = None, clerk_user_id: Optional[str] = None) -> AsyncGenerator[str, None]:
         """Generate a streaming response from the AI service."""
         try:
-            context = ""
-            if relevant_memories:
-                context = "\n\nRelevant conversation history:\n" + "\n".join([self._sanitize_text(m) for m in relevant_memories[:3]])
-            goals_text = ""
-            if user_goals:
-                goals_text = "\n\nUser focus areas/goals: " + ", ".join(user_goals[:5])
-            
-            user_prompt = f"""User message: {self._sanitize_text(user_message)}{context}{goals_text}
+            context, goals_text = self._prompt_context(relevant_memories, user_goals)
 
-Please respond as Keo, the empathetic journaling companion, following all your core instructions and safety protocols."""
-
-            headers = {
-                "Content-Type": "application/json",
-                "X-API-Key": self.api_key,
-                "anthropic-version": "2023-06-01",
-                "anthropic-beta": "messages-2023-12-15" # Recommended for streaming
-            }
+            # Shares generate_response's cache; a hit is replayed as a single chunk
+            cache_key = self._response_cache_key(clerk_user_id, user_message, context, goals_text)
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                yield cached
+                return
             
-            data = {
-                "model": "claude-3-5-sonnet-20240620",
-                "max_tokens": 1000,
-                "temperature": 0.7,
-                "system": self.system_prompt,
-                "stream": True,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ]
-            }
+            user_content = self._user_content(user_message, context, goals_text)
+            data = {**self._response_payload, "stream": True, "messages": [{"role": "user", "content": user_content}]}
             
-            async with httpx.AsyncClient() as client:
-                async with client.stream(
-                    "POST",
-                    self.base_url,
-                    headers=headers,
-                    json=data,
-                    timeout=30.0
-                ) as response:
-                    if response.status_code == 200:
-                        async for line in response.aiter_lines():
-                            if line.startswith("data: "):
-                                data_str = line[6:]
-                                if data_str == "[DONE]":
-                                    break
-                                try:
-                                    data_json = json.loads(data_str)
-                                    if data_json.get("type") == "content_block_delta":
-                                        delta = data_json.get("delta", {})
-                                        if "text" in delta:
-                                            yield delta["text"]
-                                except json.JSONDecodeError:
-                                    continue
-                    else:
-                        error_text = await response.aread()
-                        print(f"API Error: {response.status_code} - {error_text}")
-                        yield "I'm having trouble connecting right now. Could you try again?"
+            client = get_client()
+            async with client.stream(
+                "POST",
+                self.base_url,
+                headers=self._stream_headers,
+                content=orjson.dumps(data),
+                timeout=30.0
+            ) as response:
+                if response.status_code == 200:
+                    chunks: List[str] = []
+                    finished = False
+                    async for line in response.aiter_lines():
+                        if line.startswith("data: "):
+                            data_str = line[6:]
+                            if data_str == "[DONE]":
+                                break
+                            try:
+                                data_json = orjson.loads(data_str)
+                                event_type = data_json.get("type")
+                                if event_type == "content_block_delta":
+                                    delta = data_json.get("delta", {})
+                                    if "text" in delta:
+                                        chunks.append(delta["text"])
+                                        yield delta["text"]
+                                elif event_type == "message_stop":
+                                    finished = True
+                            except orjson.JSONDecodeError:
+                                continue
+                    # Only cache replies that streamed to completion
+                    if finished and chunks:
+                        self._remember_response(cache_key, "".join(chunks))
+                else:
+                    error_text = await response.aread()
+                    print(f"API Error: {response.status_code} - {error_text}")
+                    yield "I'm having trouble connecting right now. Could you try again?"
                         
         except Exception as e:
             print(f"Error generating streaming AI response: {e}")
@@ -184,66 +409,30 @@ Please respond as Keo, the empathetic journaling companion, following all your c
         """Generate a contextual opening prompt based on recent journal entries."""
         try:
             if not recent_journal_entries:
-                default_prompts = [
-                    "What's been on your mind lately?",
-                    "How are you feeling today?",
-                    "What's one thing that stood out to you today?",
-                    "I'm here to listen. What would you like to share?",
-                    "What's bringing you here for reflection today?"
-                ]
-                return random.choice(default_prompts)
+                return random.choice(_DEFAULT_OPENING_PROMPTS)
             
-            context = "Recent journal entries:\n" + "\n---\n".join([self._sanitize_text(s) for s in recent_journal_entries[:3]])
-            goals_line = f"\n\nUser goals to keep in mind: {', '.join(user_goals[:5])}" if user_goals else ""
-            
-            opening_prompt = f"""{context}{goals_line}
-
-Based on the user's recent journal entries, craft a warm, empathetic opening message that:
-1.  Acknowledges themes or emotions from recent entries without being overly specific.
-2.  Shows you remember what they've shared.
-3.  Asks a thoughtful, gentle follow-up question to continue the conversation.
-4.  Keeps it concise (1-2 sentences).
-
-Examples:
-- "I remember you mentioned feeling overwhelmed at work. How are things looking today?"
-- "It sounds like you've been processing a lot lately. What's on your mind right now?"
-
-Respond only with the opening message itself, nothing else."""
+            parts = [_OPENING_HEADER, "\n---\n".join([self._sanitize_text(s) for s in recent_journal_entries[:3]])]
+            if user_goals:
+                parts += [_OPENING_GOALS_HEADER, ", ".join(user_goals[:5])]
+            parts.append(_OPENING_INSTRUCTIONS)
+            opening_prompt = "".join(parts)
 
-            headers = {
-                "Content-Type": "application/json",
-                "X-API-Key": self.api_key,
-                "anthropic-version": "2023-06-01"
-            }
-            
-            data = {
-                "model": "claude-3-5-sonnet-20240620",
-                "max_tokens": 200,
-                "temperature": 0.8,
-                # Updated system prompt for this specific task
-                "system": "You are Keo, an empathetic AI journaling companion. Your task is to generate warm, personal opening messages based on a user's journal history. Always maintain a supportive, safe, and non-triggering tone.",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": opening_prompt
-                    }
-                ]
-            }
+            data = {**self._opening_payload, "messages": [{"role": "user", "content": opening_prompt}]}
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.base_url,
-                    headers=headers,
-                    json=data,
-                    timeout=30.0
-                )
+            client = get_client()
+            response = await client.post(
+                self.base_url,
+                headers=self._headers,
+                content=orjson.dumps(data),
+                timeout=30.0
+            )
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["content"][0]["text"].strip()
-                else:
-                    print(f"API Error: {response.status_code} - {response.text}")
-                    return "How are you feeling today?"
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                return result["content"][0]["text"].strip()
+            else:
+                print(f"API Error: {response.status_code} - {response.text}")
+                return "How are you feeling today?"
                     
         except Exception as e:
             print(f"Error generating opening prompt: {e}")
@@ -1,17 +1,26 @@
+import hashlib
 import os
 import time
 from typing import Any, Dict, Optional
 
-import httpx
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import jwt
+import orjson
+from jose import jwk, jwt
 
+from .http_client import get_client
 
-_jwks_cache: Optional[Dict[str, Any]] = None
+
+# kid -> (alg, key parsed by jose.jwk.construct), rebuilt on each JWKS fetch
+_jwks_cache: Optional[Dict[str, tuple[str, Any]]] = None
 _jwks_last_fetch: float = 0.0
 _jwks_ttl_seconds = 600
 
+# blake2b digest of a verified bearer token -> (user id, expiry); the raw token is not kept
+_verified_tokens: Dict[bytes, tuple[str, float]] = {}
+_verified_tokens_max = 4096
+_verified_token_ttl_seconds = 3600
+
 
 def _get_issuer_and_jwks() -> tuple[str, str]:
     issuer = os.getenv("CLERK_ISSUER") or os.getenv("CLERK_JWT_ISSUER")
@@ -23,18 +32,47 @@ def _get_issuer_and_jwks() -> tuple[str, str]:
     return issuer or "", jwks_url
 
 
-async def _get_jwks() -> Dict[str, Any]:
+def _index_jwks(jwks: Dict[str, Any]) -> Dict[str, tuple[str, Any]]:
+    """Map each JWKS key's kid to its algorithm and parsed key, so tokens skip the scan and PEM/JWK parse."""
+    index: Dict[str, tuple[str, Any]] = {}
+    for k in jwks.get("keys", []):
+        kid = k.get("kid")
+        if not kid:
+            continue
+        alg = k.get("alg", "RS256")
+        try:
+            index[kid] = (alg, jwk.construct(k, alg))
+        except Exception as e:
+            print(f"Skipping unusable JWKS key {kid}: {e}")
+    return index
+
+
+async def _get_jwks() -> Dict[str, tuple[str, Any]]:
     global _jwks_cache, _jwks_last_fetch
     now = time.time()
     if _jwks_cache and now - _jwks_last_fetch < _jwks_ttl_seconds:
         return _jwks_cache  # type: ignore[return-value]
     _, jwks_url = _get_issuer_and_jwks()
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(jwks_url)
-        resp.raise_for_status()
-        _jwks_cache = resp.json()
-        _jwks_last_fetch = now
-        return _jwks_cache
+    resp = await get_client().get(jwks_url, timeout=10.0)
+    resp.raise_for_status()
+    _jwks_cache = _index_jwks(orjson.loads(resp.content))
+    _jwks_last_fetch = now
+    return _jwks_cache
+
+
+def _token_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
+def _remember_token(token_key: bytes, sub: str, exp: Any) -> None:
+    """Cache a verified token until it expires (capped at _verified_token_ttl_seconds)."""
+    expires_at = time.time() + _verified_token_ttl_seconds
+    if isinstance(exp, (int, float)):
+        expires_at = min(expires_at, float(exp))
+    if len(_verified_tokens) >= _verified_tokens_max:
+        # Drop the oldest entry (dicts keep insertion order)
+        _verified_tokens.pop(next(iter(_verified_tokens)), None)
+    _verified_tokens[token_key] = (sub, expires_at)
 
 
 security = HTTPBearer(auto_error=False)
@@ -47,6 +85,12 @@ async def get_current_user_id(
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
 
     token = credentials.credentials
+    token_key = _token_key(token)
+    cached = _verified_tokens.get(token_key)
+    if cached:
+        if cached[1] > time.time():
+            return cached[0]
+        _verified_tokens.pop(token_key, None)
     try:
         issuer, _ = _get_issuer_and_jwks()
         jwks = await _get_jwks()
@@ -54,30 +98,25 @@ async def get_current_user_id(
         kid = headers.get("kid")
         if not kid:
             raise HTTPException(status_code=401, detail="Token missing kid")
-        key = None
-        for k in jwks.get("keys", []):
-            if k.get("kid") == kid:
-                key = k
-                break
-        if key is None:
+        signing_key = jwks.get(kid)
+        if signing_key is None:
             # Refresh JWKS once if kid not found
             global _jwks_cache, _jwks_last_fetch
             _jwks_cache = None
             _jwks_last_fetch = 0.0
             jwks = await _get_jwks()
-            for k in jwks.get("keys", []):
-                if k.get("kid") == kid:
-                    key = k
-                    break
-        if key is None:
+            signing_key = jwks.get(kid)
+        if signing_key is None:
             raise HTTPException(status_code=401, detail="Signing key not found")
 
         # Validate signature and claims; aud is optional depending on Clerk config
+        alg, key = signing_key
         options = {"verify_aud": False}
-        claims = jwt.decode(token, key, algorithms=[key.get("alg", "RS256")], issuer=issuer or None, options=options)
+        claims = jwt.decode(token, key, algorithms=[alg], issuer=issuer or None, options=options)
         sub = claims.get("sub")
         if not sub:
             raise HTTPException(status_code=401, detail="Invalid token claims")
+        _remember_token(token_key, sub, claims.get("exp"))
         return sub
     except HTTPException:
         raise
@@ -1,7 +1,14 @@
 import os
 import base64
-from typing import Optional
-import importlib
+from functools import lru_cache
+from typing import List, Optional
+
+try:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:  # crypto unavailable: values are stored and read as plaintext
+    hashes = AESGCM = HKDF = None
 
 
 def _get_master_secret() -> Optional[bytes]:
@@ -14,49 +21,98 @@ def _get_master_secret() -> Optional[bytes]:
 
 def _derive_key(user_id: str, master: bytes) -> bytes:
     """Derive a 256-bit key using HKDF-SHA256 with per-user salt."""
-    try:
-        hkdf_mod = importlib.import_module('cryptography.hazmat.primitives.kdf.hkdf')
-        primitives = importlib.import_module('cryptography.hazmat.primitives')
-        backends = importlib.import_module('cryptography.hazmat.backends')
-    except Exception as e:
-        raise RuntimeError("cryptography not available") from e
-
+    if HKDF is None:
+        raise RuntimeError("cryptography not available")
     salt = (user_id or "").encode("utf-8")
-    HKDF = getattr(hkdf_mod, 'HKDF')
-    hashes = getattr(primitives, 'hashes')
-    default_backend = getattr(backends, 'default_backend')
     hkdf = HKDF(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
         info=b"keo-journal-v1",
-        backend=default_backend(),
     )
     return hkdf.derive(master)
 
 
-def encrypt_text_for_user(user_id: str, plaintext: Optional[str]) -> Optional[str]:
-    if plaintext is None:
-        return None
+@lru_cache(maxsize=1024)
+def _cached_key(user_id: str, master: bytes) -> bytes:
+    """_derive_key, memoized: a user's key never changes while the master secret doesn't."""
+    return _derive_key(user_id, master)
+
+
+@lru_cache(maxsize=1024)
+def _cipher(key: bytes):
+    """Return an AESGCM (OpenSSL, AES-NI accelerated) for `key`, reused across calls."""
+    if AESGCM is None:
+        raise RuntimeError("cryptography not available")
+    return AESGCM(key)
+
+
+def derive_user_key(user_id: str) -> Optional[bytes]:
+    """Derive a user's data key once so callers encrypting many values can reuse it.
+
+    Returns None when no secret is configured or cryptography is unavailable.
+    """
     master = _get_master_secret()
     if not master:
+        return None
+    try:
+        return _cached_key(user_id, master)
+    except Exception as e:
+        print(f"Error deriving encryption key: {e}")
+        return None
+
+
+def encrypt_with_key(key: Optional[bytes], plaintext: Optional[str]) -> Optional[str]:
+    """Encrypt with a key from derive_user_key; same output format as encrypt_text_for_user."""
+    if plaintext is None:
+        return None
+    if not key:
         # No encryption configured or crypto missing: store as-is
         return plaintext
     try:
-        aead_mod = importlib.import_module('cryptography.hazmat.primitives.ciphers.aead')
-        AESGCM = getattr(aead_mod, 'AESGCM')
-        key = _derive_key(user_id, master)
-        aes = AESGCM(key)
-        import os as _os
-        nonce = _os.urandom(12)
-        ct = aes.encrypt(nonce, plaintext.encode("utf-8"), None)
-        blob = b"KEO1" + nonce + ct  # prefix to identify ciphertext format
-        return base64.b64encode(blob).decode("ascii")
+        return _seal(_cipher(key), plaintext)
     except Exception:
         # On failure, return plaintext to avoid data loss
         return plaintext
 
 
+def encrypt_many(key: Optional[bytes], plaintexts: List[Optional[str]]) -> List[Optional[str]]:
+    """Encrypt several values under one key through a single AESGCM context.
+
+    Each value still gets its own random nonce; None stays None, and any value that
+    fails to encrypt is returned as plaintext, as in encrypt_with_key.
+    """
+    if not key:
+        return list(plaintexts)
+    try:
+        aes = _cipher(key)
+    except Exception:
+        return list(plaintexts)
+    out: List[Optional[str]] = []
+    for plaintext in plaintexts:
+        if plaintext is None:
+            out.append(None)
+            continue
+        try:
+            out.append(_seal(aes, plaintext))
+        except Exception:
+            out.append(plaintext)
+    return out
+
+
+def _seal(aes, plaintext: str) -> str:
+    nonce = os.urandom(12)
+    ct = aes.encrypt(nonce, plaintext.encode("utf-8"), None)
+    blob = b"KEO1" + nonce + ct  # prefix to identify ciphertext format
+    return base64.b64encode(blob).decode("ascii")
+
+
+def encrypt_text_for_user(user_id: str, plaintext: Optional[str]) -> Optional[str]:
+    if plaintext is None:
+        return None
+    return encrypt_with_key(derive_user_key(user_id), plaintext)
+
+
 def decrypt_text_for_user(user_id: str, ciphertext_b64: Optional[str]) -> Optional[str]:
     if ciphertext_b64 is None:
         return None
@@ -65,16 +121,36 @@ def decrypt_text_for_user(user_id: str, ciphertext_b64: Optional[str]) -> Option
         # Not encrypted (or crypto unavailable); return as-is
         return ciphertext_b64
     try:
-        aead_mod = importlib.import_module('cryptography.hazmat.primitives.ciphers.aead')
-        AESGCM = getattr(aead_mod, 'AESGCM')
+        aes = _cipher(_cached_key(user_id, master))
+    except Exception:
+        return ciphertext_b64
+    return _open(aes, ciphertext_b64)
+
+
+def decrypt_many(user_id: str, values: List[Optional[str]]) -> List[Optional[str]]:
+    """Decrypt several of a user's values through a single AESGCM context.
+
+    Same per-value behavior as decrypt_text_for_user: None stays None and anything
+    that isn't our ciphertext is returned unchanged.
+    """
+    master = _get_master_secret()
+    if not master:
+        return list(values)
+    try:
+        aes = _cipher(_cached_key(user_id, master))
+    except Exception:
+        return list(values)
+    return [None if value is None else _open(aes, value) for value in values]
+
+
+def _open(aes, ciphertext_b64: str) -> str:
+    try:
         raw = base64.b64decode(ciphertext_b64)
         if len(raw) < 16 or not raw.startswith(b"KEO1"):
             # Too short to be nonce+ciphertext; treat as plaintext
             return ciphertext_b64
         body = raw[4:]
         nonce, ct = body[:12], body[12:]
-        key = _derive_key(user_id, master)
-        aes = AESGCM(key)
         pt = aes.decrypt(nonce, ct, None)
         return pt.decode("utf-8")
     except Exception:
@@ -0,0 +1,119 @@
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from psycopg2.pool import ThreadedConnectionPool
+from pgvector.psycopg2 import register_vector
+
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+# psycopg2's pool raises PoolError when exhausted; gate checkouts so callers wait instead
+_pool_slots: Optional[threading.BoundedSemaphore] = None
+# Names of server-side prepared statements already PREPAREd on each pooled connection
+_prepared: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+# Pooled connections that already have the pgvector adapter (registration queries pg_type)
+_vector_registered: "weakref.WeakSet" = weakref.WeakSet()
+# Floor on each worker's share of DB_POOL_MAX_SIZE (unless the max itself is lower)
+_MIN_CONNECTIONS_PER_WORKER = 4
+
+
+def _pool_size() -> tuple[int, int]:
+    try:
+        min_size = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
+        max_size = int(os.getenv("DB_POOL_MAX_SIZE", "25"))
+    except Exception:
+        min_size, max_size = 5, 25
+    # Split the connection budget across uvicorn workers so they stay under max_connections,
+    # but leave each worker a few connections so one long streaming response can't starve it
+    try:
+        workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except Exception:
+        workers = 1
+    max_size = max(1, min(max_size, _MIN_CONNECTIONS_PER_WORKER), max_size // workers)
+    return max(0, min(min_size, max_size)), max_size
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool, _pool_slots
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            database_url = os.getenv("DATABASE_URL")
+            if not database_url:
+                raise ValueError("DATABASE_URL environment variable is required")
+            min_size, max_size = _pool_size()
+            _pool = ThreadedConnectionPool(min_size, max_size, database_url)
+            _pool_slots = threading.BoundedSemaphore(max_size)
+            print(f"✓ Database pool ready (min={min_size}, max={max_size})")
+    return _pool
+
+
+@contextmanager
+def connection() -> Iterator:
+    """Borrow a pooled connection and return it to the pool afterwards.
+
+    The pgvector adapter is registered the first time each connection is lent out.
+    Uncommitted work is rolled back by the pool on return; connections that
+    were closed underneath us (server restart, network drop) are discarded.
+    """
+    pool = get_pool()
+    assert _pool_slots is not None
+    _pool_slots.acquire()
+    try:
+        conn = pool.getconn()
+        try:
+            if conn not in _vector_registered:
+                try:
+                    register_vector(conn)
+                    _vector_registered.add(conn)
+                except Exception:
+                    # If extension not installed yet, ignore and retry on the next checkout
+                    conn.rollback()
+            yield conn
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        _pool_slots.release()
+
+
+def close_pool() -> None:
+    """Close every pooled connection (called on application shutdown)."""
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _pool_slots = None
+
+
+def _prepared_statements_enabled() -> bool:
+    # Transaction-mode poolers (PgBouncer, Supavisor on :6543) can't keep prepared
+    # statements across transactions; set DB_PREPARED_STATEMENTS=0 behind one.
+    return os.getenv("DB_PREPARED_STATEMENTS", "1").strip().lower() not in ("0", "false", "no")
+
+
+def execute_prepared(cursor, name: str, query: str, params: tuple) -> None:
+    """Execute a %s-parameterized query as a named server-side prepared statement.
+
+    The statement is PREPAREd once per pooled connection and then reused with
+    EXECUTE, so Postgres skips parse/plan on repeat calls.
+    """
+    if not _prepared_statements_enabled():
+        cursor.execute(query, params)
+        return
+    conn = cursor.connection
+    names = _prepared.setdefault(conn, set())
+    if name not in names:
+        parts = query.split("%s")
+        statement = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+        cursor.execute(f"PREPARE {name} AS {statement}")
+        names.add(name)
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
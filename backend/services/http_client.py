@@ -0,0 +1,30 @@
+from typing import Optional
+
+import httpx
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the process-wide HTTP client, creating it on first use.
+
+    Every outbound call (Anthropic, Clerk JWKS) shares its HTTP/2 keep-alive pool,
+    so repeat requests skip the TCP and TLS handshakes.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client (called on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,12 +1,85 @@
 import os
+import math
+import re
+import time
+import threading
 import asyncio
-from typing import List, Optional, Dict, Any
-from datetime import datetime
-import psycopg2
+from collections import Counter
+from typing import List, Optional, Dict, Any, Iterator, NamedTuple, Tuple
+from datetime import datetime, date, timedelta
 from psycopg2.extras import RealDictCursor
-from pgvector.psycopg2 import register_vector
 import numpy as np
-from .crypto_utils import encrypt_text_for_user, decrypt_text_for_user
+from .crypto_utils import encrypt_text_for_user, decrypt_text_for_user, decrypt_many
+from .db_pool import connection, execute_prepared
+
+# Runs of alphanumeric characters (\w without the underscore), i.e. what str.isalnum() accepts
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def _tokenize(text: str) -> List[str]:
+    return [w.lower() for w in _TOKEN_RE.findall(text)] if text else []
+
+
+def _word_counts(text: str) -> Tuple[Tuple[str, int], ...]:
+    """(word, count) pairs of an entry."""
+    return tuple(Counter(_tokenize(text)).items())
+
+
+class _MemoryIndex(NamedTuple):
+    """Word counts of a user's recent entries (newest first), stored column-major.
+
+    The entries containing vocabulary word j, and how often, are
+    rows[col_ptr[j]:col_ptr[j + 1]] and counts[...] over the same slice: an
+    inverted index, so a query reads only the postings of its own words.
+    entry_counts keeps each entry's word counts by (id, updated_at), so the next
+    rebuild only tokenizes entries that are new or were edited.
+    """
+    version: tuple
+    contents: List[Optional[str]]
+    entry_counts: Dict[tuple, Tuple[Tuple[str, int], ...]]
+    vocab: Dict[str, int]
+    col_ptr: np.ndarray
+    rows: np.ndarray
+    counts: np.ndarray
+
+    @classmethod
+    def build(
+        cls,
+        version: tuple,
+        keys: List[tuple],
+        contents: List[Optional[str]],
+        previous: Optional["_MemoryIndex"] = None,
+    ) -> "_MemoryIndex":
+        known = previous.entry_counts if previous is not None else {}
+        entry_counts: Dict[tuple, Tuple[Tuple[str, int], ...]] = {}
+        vocab: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        counts: List[int] = []
+        for i, (key, content) in enumerate(zip(keys, contents)):
+            pairs = known.get(key)
+            if pairs is None:
+                pairs = _word_counts(content or "")
+            entry_counts[key] = pairs
+            for w, c in pairs:
+                rows.append(i)
+                cols.append(vocab.setdefault(w, len(vocab)))
+                counts.append(c)
+        col_array = np.array(cols, dtype=np.intp)
+        # Stable sort keeps each posting list in row (newest-first) order
+        order = np.argsort(col_array, kind="stable")
+        col_ptr = np.zeros(len(vocab) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(col_array, minlength=len(vocab)), out=col_ptr[1:])
+        return cls(
+            version,
+            contents,
+            entry_counts,
+            vocab,
+            col_ptr,
+            np.array(rows, dtype=np.intp)[order],
+            np.array(counts, dtype=float)[order],
+        )
+
 
 class MemoryService:
     def __init__(self):
@@ -16,54 +89,130 @@ class MemoryService:
             raise ValueError("DATABASE_URL environment variable is required")
         # Claude-first app: remove OpenAI usage; memory retrieval will use lexical similarity
         print("✓ MemoryService initialized (Claude-first, no OpenAI)")
-        self._initialize_database()
-
-    def _connect(self):
-        """Create a DB connection and register pgvector adapter."""
-        conn = psycopg2.connect(self.database_url)
+        # Users already upserted by this process: clerk_user_id -> time ensured
+        self._ensured_users: Dict[str, float] = {}
+        self._ensured_users_lock = threading.Lock()
+        self._ensured_users_max = 100_000
         try:
-            register_vector(conn)
+            self._ensured_users_ttl = int(os.getenv("ENSURED_USERS_TTL_SECONDS", "3600"))
         except Exception:
-            # If extension not installed yet or already registered, ignore
-            pass
-        return conn
+            self._ensured_users_ttl = 3600
+        # Per-user _MemoryIndex of recent entries, reused until get_journal_version changes
+        # Each index holds decrypted entries, so it expires like AIService's sanitized-text cache
+        self._memory_index: Dict[str, Tuple[float, _MemoryIndex]] = {}
+        self._memory_index_lock = threading.Lock()
+        self._memory_index_max = 512
+        try:
+            self._memory_index_ttl = int(os.getenv("SANITIZE_CACHE_TTL_SECONDS", "300"))
+        except Exception:
+            self._memory_index_ttl = 300
+        self._initialize_database()
+
+    def _connection(self):
+        """Borrow a pooled DB connection (pgvector adapter registered)."""
+        return connection()
+
+    def _decrypt_rows(self, clerk_user_id: str, rows: List[Dict[str, Any]]) -> None:
+        """Decrypt the title and content of fetched journal rows in place, one batch per column."""
+        if not rows:
+            return
+        titles = decrypt_many(clerk_user_id, [r.get("title") for r in rows])
+        contents = decrypt_many(clerk_user_id, [r.get("content") for r in rows])
+        for r, title, content in zip(rows, titles, contents):
+            r["title"] = title
+            r["content"] = content
     
     def _initialize_database(self):
         try:
-            conn = self._connect()
-            cursor = conn.cursor()
-            
-            # Create table for users
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    clerk_user_id TEXT UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS journal_entries (
-                    id SERIAL PRIMARY KEY,
-                    clerk_user_id TEXT NOT NULL,
-                    title TEXT,
-                    content TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            # User goals table: one row per user (JSON text payload)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_goals (
-                    clerk_user_id TEXT PRIMARY KEY,
-                    goals_json TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
+            with self._connection() as conn, conn.cursor() as cursor:
+                # Serialize schema setup across workers starting at the same time; concurrent
+                # CREATE ... IF NOT EXISTS can still collide on the catalog
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('keo_schema'))")
+
+                # Create table for users
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS users (
+                        id SERIAL PRIMARY KEY,
+                        clerk_user_id TEXT UNIQUE NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS journal_entries (
+                        id SERIAL PRIMARY KEY,
+                        clerk_user_id TEXT NOT NULL,
+                        title TEXT,
+                        content TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                # Every journal query filters by user and orders/filters by created_at
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS ix_je_user_created
+                    ON journal_entries (clerk_user_id, created_at DESC);
+                """)
+                # get_journal_version's COUNT/MAX(updated_at) runs on every cached lookup;
+                # this lets it answer from an index-only scan instead of the heap
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS ix_je_user_updated
+                    ON journal_entries (clerk_user_id, updated_at);
+                """)
+                # User goals table: one row per user (JSON text payload)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_goals (
+                        clerk_user_id TEXT PRIMARY KEY,
+                        goals_json TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                # Per-user entry counts kept current by triggers, so /journal/count is a key lookup
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_stats (
+                        clerk_user_id TEXT PRIMARY KEY,
+                        journal_count INTEGER NOT NULL DEFAULT 0
+                    );
+                """)
+                cursor.execute("""
+                    CREATE OR REPLACE FUNCTION je_count_incr() RETURNS trigger AS $$
+                    BEGIN
+                        INSERT INTO user_stats (clerk_user_id, journal_count)
+                        VALUES (NEW.clerk_user_id, 1)
+                        ON CONFLICT (clerk_user_id)
+                        DO UPDATE SET journal_count = user_stats.journal_count + 1;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql;
+                """)
+                cursor.execute("""
+                    CREATE OR REPLACE FUNCTION je_count_decr() RETURNS trigger AS $$
+                    BEGIN
+                        UPDATE user_stats SET journal_count = GREATEST(journal_count - 1, 0)
+                        WHERE clerk_user_id = OLD.clerk_user_id;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql;
+                """)
+                # Install the triggers once and seed counts from existing rows in the same transaction
+                cursor.execute("""
+                    DO $$
+                    BEGIN
+                        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'je_count_incr') THEN
+                            LOCK TABLE journal_entries IN SHARE ROW EXCLUSIVE MODE;
+                            CREATE TRIGGER je_count_incr AFTER INSERT ON journal_entries
+                                FOR EACH ROW EXECUTE FUNCTION je_count_incr();
+                            CREATE TRIGGER je_count_decr AFTER DELETE ON journal_entries
+                                FOR EACH ROW EXECUTE FUNCTION je_count_decr();
+                            INSERT INTO user_stats (clerk_user_id, journal_count)
+                            SELECT clerk_user_id, COUNT(*) FROM journal_entries GROUP BY clerk_user_id
+                            ON CONFLICT (clerk_user_id) DO UPDATE SET journal_count = EXCLUDED.journal_count;
+                        END IF;
+                    END;
+                    $$;
+                """)
             
-            conn.commit()
-            cursor.close()
-            conn.close()
+                conn.commit()
             print("✓ Memory database initialized")
             
         except Exception as e:
@@ -71,179 +220,366 @@ class MemoryService:
             print("Memory features will be disabled")
     
     async def get_relevant_memories(self, clerk_user_id: str, query: str, limit: int = 3) -> List[str]:
+        # The query, decryption and scoring all block, so run them off the event loop
+        return await asyncio.to_thread(self._relevant_memories, clerk_user_id, query, limit)
+
+    def _relevant_memories(self, clerk_user_id: str, query: str, limit: int) -> List[str]:
         try:
             # Lexical similarity (cosine on bag-of-words) over recent journal entries
-            conn = self._connect()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(
-                """
-                SELECT id, content, created_at
-                FROM journal_entries
-                WHERE clerk_user_id = %s
-                ORDER BY created_at DESC
-                LIMIT 200
-                """,
-                (clerk_user_id,),
-            )
-            rows = cursor.fetchall() or []
-            # Decrypt content for similarity
-            for row in rows:
-                row["content"] = decrypt_text_for_user(clerk_user_id, row.get("content"))
-            cursor.close()
-            conn.close()
-
-            def tokenize(t: str) -> List[str]:
-                return [w for w in ''.join([c.lower() if c.isalnum() else ' ' for c in t]).split() if w]
-
-            q_tokens = tokenize(query or "")
+            q_tokens = _tokenize(query or "")
             if not q_tokens:
                 return []
+            index = self._memory_index_for(clerk_user_id)
+            if index is None:
+                return []
+            n = len(index.contents)
 
             vocab: Dict[str, int] = {}
             for w in q_tokens:
                 if w not in vocab:
                     vocab[w] = len(vocab)
 
-            def vec(tokens: List[str]) -> np.ndarray:
-                v = np.zeros(len(vocab), dtype=float)
-                for w in tokens:
-                    idx = vocab.get(w)
-                    if idx is not None:
-                        v[idx] += 1.0
-                n = np.linalg.norm(v)
-                return v / n if n > 0 else v
-
-            q_vec = vec(q_tokens)
-
-            scored: List[Dict[str, Any]] = []
-            for row in rows:
-                d_tokens = tokenize(row.get("content") or "")
-                d_vec = vec(d_tokens)
-                sim = float(np.dot(q_vec, d_vec)) if q_vec.size and d_vec.size else 0.0
-                if sim > 0:
-                    scored.append({"row": row, "sim": sim})
-
-            scored.sort(key=lambda x: x["sim"], reverse=True)
-            top = scored[:limit]
-            return [f"Previous entry: {it['row']['content']}" for it in top]
+            counts = Counter(q_tokens)
+            q_vec = np.array([counts[w] for w in vocab], dtype=float)
+            q_vec /= math.sqrt(np.vdot(q_vec, q_vec))
+
+            # One (rows x query vocabulary) count matrix, L2-normalized per row, so every
+            # row is scored by a single matrix-vector product. Each query word's column is
+            # filled from its posting list; entries sharing no word with the query stay zero.
+            doc_matrix = np.zeros((n, len(vocab)), dtype=float)
+            for w, j in vocab.items():
+                col = index.vocab.get(w)
+                if col is not None:
+                    start, end = index.col_ptr[col], index.col_ptr[col + 1]
+                    doc_matrix[index.rows[start:end], j] = index.counts[start:end]
+            norms = np.sqrt(np.einsum("ij,ij->i", doc_matrix, doc_matrix))
+            doc_matrix /= np.where(norms > 0, norms, 1.0)[:, None]
+            sims = doc_matrix @ q_vec
+
+            positive = np.flatnonzero(sims > 0)
+            if positive.size == 0 or limit <= 0:
+                return []
+            if positive.size > limit:
+                # Keep only rows scoring at least the limit-th best (O(N) partition, no full sort)
+                kth = np.partition(sims[positive], -limit)[-limit]
+                positive = positive[sims[positive] >= kth]
+            # Best first; ties keep the newest-first row order
+            top = positive[np.lexsort((positive, -sims[positive]))][:limit]
+            return [f"Previous entry: {index.contents[i]}" for i in top]
             
         except Exception as e:
             print(f"Error retrieving memories: {e}")
             return []
 
-    def ensure_user(self, clerk_user_id: str):
-        try:
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
+    def _memory_index_for(self, clerk_user_id: str) -> Optional["_MemoryIndex"]:
+        """Return the user's bag-of-words index, rebuilding it only when their journal changed."""
+        version = self.get_journal_version(clerk_user_id)
+        if version is None:
+            return None
+        now = time.monotonic()
+        with self._memory_index_lock:
+            # Dicts keep insertion order, so expired indexes sit at the front
+            while self._memory_index:
+                oldest = next(iter(self._memory_index))
+                if now - self._memory_index[oldest][0] <= self._memory_index_ttl:
+                    break
+                del self._memory_index[oldest]
+            cached = self._memory_index.get(clerk_user_id)
+        index = cached[1] if cached else None
+        if index is not None and index.version == version:
+            return index
+        with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            execute_prepared(
+                cursor,
+                "keo_recent_entry_rows",
                 """
-                INSERT INTO users (clerk_user_id)
-                VALUES (%s)
-                ON CONFLICT (clerk_user_id) DO NOTHING
+                SELECT id, content, created_at, updated_at
+                FROM journal_entries
+                WHERE clerk_user_id = %s
+                ORDER BY created_at DESC
+                LIMIT 200
                 """,
                 (clerk_user_id,),
             )
-            conn.commit()
-            cursor.close()
-            conn.close()
+            rows = cursor.fetchall() or []
+        contents = decrypt_many(clerk_user_id, [row.get("content") for row in rows])
+        keys = [(row["id"], row.get("updated_at")) for row in rows]
+        index = _MemoryIndex.build(version, keys, contents, index)
+        with self._memory_index_lock:
+            self._memory_index.pop(clerk_user_id, None)
+            if len(self._memory_index) >= self._memory_index_max:
+                self._memory_index.pop(next(iter(self._memory_index)))
+            self._memory_index[clerk_user_id] = (now, index)
+        return index
+
+    def ensure_user(self, clerk_user_id: str):
+        ensured_at = self._ensured_users.get(clerk_user_id)
+        if ensured_at is not None and time.monotonic() - ensured_at <= self._ensured_users_ttl:
+            return
+        try:
+            with self._connection() as conn, conn.cursor() as cursor:
+                execute_prepared(
+                    cursor,
+                    "keo_ensure_user",
+                    """
+                    INSERT INTO users (clerk_user_id)
+                    VALUES (%s)
+                    ON CONFLICT (clerk_user_id) DO NOTHING
+                    """,
+                    (clerk_user_id,),
+                )
+                conn.commit()
+            # Callers may run on worker threads; keep the evict-then-insert step atomic
+            with self._ensured_users_lock:
+                self._ensured_users.pop(clerk_user_id, None)
+                if len(self._ensured_users) >= self._ensured_users_max:
+                    # Dicts keep insertion order, so the first key is the oldest entry
+                    self._ensured_users.pop(next(iter(self._ensured_users)))
+                self._ensured_users[clerk_user_id] = time.monotonic()
         except Exception as e:
             print(f"Error ensuring user: {e}")
 
-    def create_journal_entry(self, clerk_user_id: str, title: Optional[str], content: str):
+    def create_journal_entry(self, clerk_user_id: str, title: Optional[str], content: str) -> Optional[Dict[str, Any]]:
+        """Insert an entry and return the stored row (decrypted), or None on failure."""
         try:
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO journal_entries (clerk_user_id, title, content)
-                VALUES (%s, %s, %s)
-                RETURNING id
-                """,
-                (
-                    clerk_user_id,
-                    encrypt_text_for_user(clerk_user_id, title) if title is not None else None,
-                    encrypt_text_for_user(clerk_user_id, content),
-                ),
-            )
-            row = cursor.fetchone()
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return row[0] if row else None
+            with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO journal_entries (clerk_user_id, title, content)
+                    VALUES (%s, %s, %s)
+                    RETURNING id, title, content, created_at, updated_at
+                    """,
+                    (
+                        clerk_user_id,
+                        encrypt_text_for_user(clerk_user_id, title) if title is not None else None,
+                        encrypt_text_for_user(clerk_user_id, content),
+                    ),
+                )
+                row = cursor.fetchone()
+                conn.commit()
+            if not row:
+                return None
+            row["title"] = title
+            row["content"] = content
+            return row
         except Exception as e:
             print(f"Error creating journal entry: {e}")
             return None
 
     def list_journal_entries(self, clerk_user_id: str, limit: int = 20, offset: int = 0):
         try:
-            conn = self._connect()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(
-                """
-                SELECT id, title, content, created_at, updated_at
-                FROM journal_entries
-                WHERE clerk_user_id = %s
-                ORDER BY created_at DESC
-                LIMIT %s OFFSET %s
-                """,
-                (clerk_user_id, limit, offset),
-            )
-            rows = cursor.fetchall()
+            with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_prepared(
+                    cursor,
+                    "keo_list_journal_entries",
+                    """
+                    SELECT id, title, content, created_at, updated_at
+                    FROM journal_entries
+                    WHERE clerk_user_id = %s
+                    ORDER BY created_at DESC
+                    LIMIT %s OFFSET %s
+                    """,
+                    (clerk_user_id, limit, offset),
+                )
+                rows = cursor.fetchall()
             # Decrypt fields
-            for r in rows:
-                r["title"] = decrypt_text_for_user(clerk_user_id, r.get("title")) if r.get("title") is not None else None
-                r["content"] = decrypt_text_for_user(clerk_user_id, r.get("content"))
-            cursor.close()
-            conn.close()
+            self._decrypt_rows(clerk_user_id, rows)
             return rows
         except Exception as e:
             print(f"Error listing journal entries: {e}")
             return []
 
-    def update_journal_entry(self, clerk_user_id: str, entry_id: int, title: Optional[str] = None, content: Optional[str] = None) -> bool:
-        """Update title and/or content for a journal entry owned by the user."""
+    def iter_journal_entries(self, clerk_user_id: str, offset: int = 0, itersize: int = 500) -> Iterator[Dict[str, Any]]:
+        """Yield the user's journal entries newest-first from a server-side cursor.
+
+        Rows are fetched from Postgres `itersize` at a time, so memory stays flat
+        regardless of how many entries the user has. Errors are re-raised: by then a
+        streamed response has started, and ending it cleanly would pass a partial
+        list off as complete.
+        """
+        try:
+            with self._connection() as conn, conn.cursor(name="journal_iter", cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(
+                    """
+                    SELECT id, title, content, created_at, updated_at
+                    FROM journal_entries
+                    WHERE clerk_user_id = %s
+                    ORDER BY created_at DESC
+                    OFFSET %s
+                    """,
+                    (clerk_user_id, offset),
+                )
+                while True:
+                    rows = cursor.fetchmany(itersize)
+                    if not rows:
+                        break
+                    self._decrypt_rows(clerk_user_id, rows)
+                    yield from rows
+        except Exception as e:
+            print(f"Error streaming journal entries: {e}")
+            raise
+
+    def list_entries_since(self, clerk_user_id: str, cutoff: datetime, limit: int = 200) -> List[Dict[str, Any]]:
+        """List entries created at or after `cutoff`, newest-first (at most `limit`)."""
+        try:
+            with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_prepared(
+                    cursor,
+                    "keo_list_entries_since",
+                    """
+                    SELECT id, title, content, created_at, updated_at
+                    FROM journal_entries
+                    WHERE clerk_user_id = %s AND created_at >= %s
+                    ORDER BY created_at DESC
+                    LIMIT %s
+                    """,
+                    (clerk_user_id, cutoff, limit),
+                )
+                rows = cursor.fetchall()
+            self._decrypt_rows(clerk_user_id, rows)
+            return rows
+        except Exception as e:
+            print(f"Error listing journal entries since {cutoff}: {e}")
+            return []
+
+    def list_active_dates(self, clerk_user_id: str, limit_days: int = 365) -> List[date]:
+        """Distinct days (oldest first) on which the user wrote an entry, over the last `limit_days` days."""
+        since = date.today() - timedelta(days=max(0, limit_days - 1))
+        try:
+            with self._connection() as conn, conn.cursor() as cursor:
+                execute_prepared(
+                    cursor,
+                    "keo_list_active_dates",
+                    """
+                    SELECT DISTINCT created_at::date
+                    FROM journal_entries
+                    WHERE clerk_user_id = %s AND created_at >= %s
+                    ORDER BY 1
+                    """,
+                    (clerk_user_id, since),
+                )
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error listing active dates: {e}")
+            return []
+
+    def get_journal_entry(self, clerk_user_id: str, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Fetch a single journal entry owned by the user, or None if it doesn't exist."""
+        try:
+            with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_prepared(
+                    cursor,
+                    "keo_get_journal_entry",
+                    """
+                    SELECT id, title, content, created_at, updated_at
+                    FROM journal_entries
+                    WHERE id = %s AND clerk_user_id = %s
+                    """,
+                    (entry_id, clerk_user_id),
+                )
+                row = cursor.fetchone()
+            if not row:
+                return None
+            row["title"] = decrypt_text_for_user(clerk_user_id, row.get("title")) if row.get("title") is not None else None
+            row["content"] = decrypt_text_for_user(clerk_user_id, row.get("content"))
+            return row
+        except Exception as e:
+            print(f"Error fetching journal entry: {e}")
+            return None
+
+    def get_journal_version(self, clerk_user_id: str) -> Optional[tuple]:
+        """Return (entry_count, latest updated_at) for the user's journal.
+
+        Any create, edit or delete changes this tuple, so it works as a cheap
+        cache key for results derived from the user's entries. Returns None on error.
+        """
+        try:
+            with self._connection() as conn, conn.cursor() as cursor:
+                execute_prepared(
+                    cursor,
+                    "keo_journal_version",
+                    "SELECT COUNT(*), MAX(updated_at) FROM journal_entries WHERE clerk_user_id = %s",
+                    (clerk_user_id,),
+                )
+                row = cursor.fetchone()
+            return (int(row[0]), row[1]) if row else (0, None)
+        except Exception as e:
+            print(f"Error fetching journal version: {e}")
+            return None
+
+    def count_journal_entries(self, clerk_user_id: str) -> int:
+        try:
+            with self._connection() as conn, conn.cursor() as cursor:
+                execute_prepared(
+                    cursor,
+                    "keo_user_journal_count",
+                    "SELECT journal_count FROM user_stats WHERE clerk_user_id = %s",
+                    (clerk_user_id,),
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    # No stats row yet (user has never written); fall back to counting
+                    execute_prepared(
+                        cursor,
+                        "keo_count_journal_entries",
+                        "SELECT COUNT(*) FROM journal_entries WHERE clerk_user_id = %s",
+                        (clerk_user_id,),
+                    )
+                    row = cursor.fetchone()
+            return int(row[0]) if row else 0
+        except Exception as e:
+            print(f"Error counting journal entries: {e}")
+            return 0
+
+    def update_journal_entry(self, clerk_user_id: str, entry_id: int, title: Optional[str] = None, content: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Update title and/or content for a journal entry owned by the user.
+
+        Returns the updated row (decrypted), or None if nothing was updated.
+        """
         if title is None and content is None:
-            return False
+            return None
         try:
-            conn = self._connect()
-            cursor = conn.cursor()
-            # Build dynamic query
-            fields = []
-            params = []
-            if title is not None:
-                fields.append("title = %s")
-                params.append(encrypt_text_for_user(clerk_user_id, title))
-            if content is not None:
-                fields.append("content = %s")
-                params.append(encrypt_text_for_user(clerk_user_id, content))
-            fields.append("updated_at = CURRENT_TIMESTAMP")
-            params.extend([clerk_user_id, entry_id])
-            query = f"UPDATE journal_entries SET {', '.join(fields)} WHERE clerk_user_id = %s AND id = %s"
-            cursor.execute(query, tuple(params))
-            updated = cursor.rowcount > 0
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return updated
+            with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                # Build dynamic query
+                fields = []
+                params = []
+                if title is not None:
+                    fields.append("title = %s")
+                    params.append(encrypt_text_for_user(clerk_user_id, title))
+                if content is not None:
+                    fields.append("content = %s")
+                    params.append(encrypt_text_for_user(clerk_user_id, content))
+                fields.append("updated_at = CURRENT_TIMESTAMP")
+                params.extend([clerk_user_id, entry_id])
+                query = (
+                    f"UPDATE journal_entries SET {', '.join(fields)} WHERE clerk_user_id = %s AND id = %s "
+                    "RETURNING id, title, content, created_at, updated_at"
+                )
+                cursor.execute(query, tuple(params))
+                row = cursor.fetchone()
+                conn.commit()
+            if not row:
+                return None
+            row["title"] = decrypt_text_for_user(clerk_user_id, row.get("title")) if row.get("title") is not None else None
+            row["content"] = decrypt_text_for_user(clerk_user_id, row.get("content"))
+            return row
         except Exception as e:
             print(f"Error updating journal entry: {e}")
-            return False
+            return None
 
     def delete_journal_entry(self, clerk_user_id: str, entry_id: int) -> bool:
         try:
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                DELETE FROM journal_entries
-                WHERE clerk_user_id = %s AND id = %s
-                """,
-                (clerk_user_id, entry_id)
-            )
-            deleted = cursor.rowcount > 0
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self._connection() as conn, conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    DELETE FROM journal_entries
+                    WHERE clerk_user_id = %s AND id = %s
+                    """,
+                    (clerk_user_id, entry_id)
+                )
+                deleted = cursor.rowcount > 0
+                conn.commit()
             return deleted
         except Exception as e:
             print(f"Error deleting journal entry: {e}")
@@ -257,17 +593,16 @@ class MemoryService:
     # --- User goals CRUD ---
     def get_user_goals(self, clerk_user_id: str) -> List[str]:
         try:
-            conn = self._connect()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(
-                """
-                SELECT goals_json FROM user_goals WHERE clerk_user_id = %s
-                """,
-                (clerk_user_id,)
-            )
-            row = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                execute_prepared(
+                    cursor,
+                    "keo_get_user_goals",
+                    """
+                    SELECT goals_json FROM user_goals WHERE clerk_user_id = %s
+                    """,
+                    (clerk_user_id,)
+                )
+                row = cursor.fetchone()
             if not row or not row.get("goals_json"):
                 return []
             try:
@@ -290,20 +625,17 @@ class MemoryService:
             import json
             goals_json = json.dumps(goals)
             enc = encrypt_text_for_user(clerk_user_id, goals_json)
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO user_goals (clerk_user_id, goals_json, updated_at)
-                VALUES (%s, %s, CURRENT_TIMESTAMP)
-                ON CONFLICT (clerk_user_id)
-                DO UPDATE SET goals_json = EXCLUDED.goals_json, updated_at = CURRENT_TIMESTAMP
-                """,
-                (clerk_user_id, enc)
-            )
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self._connection() as conn, conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO user_goals (clerk_user_id, goals_json, updated_at)
+                    VALUES (%s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (clerk_user_id)
+                    DO UPDATE SET goals_json = EXCLUDED.goals_json, updated_at = CURRENT_TIMESTAMP
+                    """,
+                    (clerk_user_id, enc)
+                )
+                conn.commit()
             return True
         except Exception as e:
             print(f"Error setting user goals: {e}")
@@ -321,4 +653,19 @@ class MemoryService:
             return data
         except Exception as e:
             print(f"Error exporting data: {e}")
-            return {"journal_entries": [], "conversations": [], "goals": []}
\ No newline at end of file
+            return {"journal_entries": [], "conversations": [], "goals": []}
+
+    def iter_export_rows(self, clerk_user_id: str) -> Iterator[Dict[str, Any]]:
+        """Yield the user's export one record at a time: goals first, then every journal entry,
+        then an {"kind": "end", "journal_count": n} record.
+
+        Entries come from a server-side cursor, so memory stays flat for large journals.
+        A failure raises before the end record, so a client can tell a cut-off export from
+        a complete one.
+        """
+        yield {"kind": "goals", "goals": self.get_user_goals(clerk_user_id)}
+        journal_count = 0
+        for entry in self.iter_journal_entries(clerk_user_id):
+            journal_count += 1
+            yield {"kind": "journal", **entry}
+        yield {"kind": "end", "journal_count": journal_count}
\ No newline at end of file
@@ -1,16 +1,22 @@
 import os
 import asyncio
+import hashlib
+import heapq
 from typing import List, Dict, Any, Optional, Set, Tuple
-import psycopg2
 from psycopg2.extras import RealDictCursor
-from pgvector.psycopg2 import register_vector
 import numpy as np
 from collections import Counter
 import json
 from datetime import datetime
 import re
 import math
-import httpx
+import orjson
+from .db_pool import connection
+from .http_client import get_client
+
+class _FallbackAnalysis(dict):
+    """A generic analysis built after an error; lets callers tell it apart from a real one."""
+
 
 class VectorInsightsService:
     """
@@ -42,17 +48,10 @@ class VectorInsightsService:
 
     def _connect(self):
         """
-        Creates and returns a new database connection.
-        Registers the pgvector adapter safely.
+        Borrows a connection from the shared pool (returned when the `with` block exits).
+        The pool registers the pgvector adapter on first checkout of each connection.
         """
-        conn = psycopg2.connect(self.database_url)
-        try:
-            register_vector(conn)
-        except Exception as e:
-            # This might happen if the extension isn't installed, but we can proceed
-            # since fast analysis doesn't rely on vector operations in the DB.
-            print(f"Warning: Could not register pgvector adapter. {e}")
-        return conn
+        return connection()
 
     async def analyze_journal_entry_fast(self, content: str, entry_id: int, user_id: str) -> Dict[str, Any]:
         """
@@ -82,22 +81,26 @@ class VectorInsightsService:
             print(f"Error in Claude analysis for entry_id {entry_id}: {e}")
             return self._create_fallback_analysis(content)
 
+    def _recent_entries(self, user_id: str, exclude_id: int, limit: int) -> List[Dict]:
+        """Fetches the user's most recent entries other than `exclude_id` (blocking; run in a thread)."""
+        with self._connect() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(
+                """
+                SELECT id, content, created_at
+                FROM journal_entries WHERE clerk_user_id = %s AND id != %s
+                ORDER BY created_at DESC LIMIT %s
+                """,
+                (user_id, exclude_id, limit),
+            )
+            return cursor.fetchall() or []
+
     async def _find_similar_entries_textual(self, content: str, user_id: str, exclude_id: int, limit: int = 5, candidate_pool: int = 100) -> List[Dict]:
         """
         Finds similar entries using TF-IDF cosine similarity on recent entries.
         This provides better lexical matching than simple bag-of-words.
         """
         try:
-            with self._connect() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(
-                    """
-                    SELECT id, content, created_at
-                    FROM journal_entries WHERE clerk_user_id = %s AND id != %s
-                    ORDER BY created_at DESC LIMIT %s
-                    """,
-                    (user_id, exclude_id, candidate_pool),
-                )
-                docs = cursor.fetchall() or []
+            docs = await asyncio.to_thread(self._recent_entries, user_id, exclude_id, candidate_pool)
 
             if not docs:
                 return []
@@ -134,7 +137,7 @@ class VectorInsightsService:
                 tf = tf / len(tokens) if tokens else tf
                 
                 tfidf = tf * idf
-                norm = np.linalg.norm(tfidf)
+                norm = math.sqrt(np.vdot(tfidf, tfidf))
                 return tfidf / norm if norm > 0 else tfidf
 
             query_vec = to_tfidf_vector(query_tokens)
@@ -149,8 +152,8 @@ class VectorInsightsService:
                 "similarity": score
             } for doc, score in zip(docs, scores)]
 
-            scored_docs.sort(key=lambda x: x["similarity"], reverse=True)
-            return [d for d in scored_docs if d['similarity'] > 0.1][:limit]
+            # Only the top `limit` are needed, so skip the full sort
+            return heapq.nlargest(limit, (d for d in scored_docs if d['similarity'] > 0.1), key=lambda x: x["similarity"])
 
         except Exception as e:
             print(f"Error finding similar entries (textual TF-IDF): {e}")
@@ -219,39 +222,39 @@ Focus on being empathetic, non-judgmental, and helpful. Identify 1-3 emotions ma
                 ]
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.base_url,
-                    headers=headers,
-                    json=data,
-                    timeout=30.0
-                )
+            client = get_client()
+            response = await client.post(
+                self.base_url,
+                headers=headers,
+                content=orjson.dumps(data),
+                timeout=30.0
+            )
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    claude_response = result["content"][0]["text"]
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                claude_response = result["content"][0]["text"]
                     
-                    # Parse the JSON response
-                    try:
-                        analysis = json.loads(claude_response)
-                        # Validate required fields and provide defaults
-                        return {
-                            "summary": analysis.get("summary", "Journal entry analyzed."),
-                            "emotions": analysis.get("emotions", [{"emotion": "reflective", "intensity": 0.7, "description": "General reflection detected."}]),
-                            "themes": analysis.get("themes", [{"theme": "Personal Reflection", "relevance": 0.8, "description": "General life reflection."}]),
-                            "sentiment_score": float(analysis.get("sentiment_score", 0.5)),
-                            "sentiment_trend": analysis.get("sentiment_trend", "neutral"),
-                            "key_insights": analysis.get("key_insights", ["You engaged in meaningful self-reflection."]),
-                            "growth_areas": analysis.get("growth_areas", ["Continue journaling for self-awareness."]),
-                            "support_suggestions": analysis.get("support_suggestions", ["Keep exploring your thoughts and feelings."])
-                        }
-                    except json.JSONDecodeError:
-                        print(f"Failed to parse Claude JSON response: {claude_response}")
-                        return self._create_fallback_analysis(content)
-                        
-                else:
-                    print(f"Claude API Error: {response.status_code} - {response.text}")
+                # Parse the JSON response
+                try:
+                    analysis = json.loads(claude_response)
+                    # Validate required fields and provide defaults
+                    return {
+                        "summary": analysis.get("summary", "Journal entry analyzed."),
+                        "emotions": analysis.get("emotions", [{"emotion": "reflective", "intensity": 0.7, "description": "General reflection detected."}]),
+                        "themes": analysis.get("themes", [{"theme": "Personal Reflection", "relevance": 0.8, "description": "General life reflection."}]),
+                        "sentiment_score": float(analysis.get("sentiment_score", 0.5)),
+                        "sentiment_trend": analysis.get("sentiment_trend", "neutral"),
+                        "key_insights": analysis.get("key_insights", ["You engaged in meaningful self-reflection."]),
+                        "growth_areas": analysis.get("growth_areas", ["Continue journaling for self-awareness."]),
+                        "support_suggestions": analysis.get("support_suggestions", ["Keep exploring your thoughts and feelings."])
+                    }
+                except json.JSONDecodeError:
+                    print(f"Failed to parse Claude JSON response: {claude_response}")
                     return self._create_fallback_analysis(content)
+                        
+            else:
+                print(f"Claude API Error: {response.status_code} - {response.text}")
+                return self._create_fallback_analysis(content)
                     
         except Exception as e:
             print(f"Error calling Claude API: {e}")
@@ -265,32 +268,95 @@ Focus on being empathetic, non-judgmental, and helpful. Identify 1-3 emotions ma
 
 
     # --- Cached single-entry analysis ---
-    async def analyze_journal_entry_fast_cached(self, content: str, entry_id: int, user_id: str, updated_at: Any) -> Dict[str, Any]:
-        """Wrapper that caches analyze_journal_entry_fast by (entry_id, updated_at_iso)."""
+    def _insights_cache_key(self, entry_id: int, updated_at: Any) -> Tuple[int, str]:
         try:
             # Normalize updated_at to iso string for the cache key
             if hasattr(updated_at, 'isoformat'):
                 updated_iso = updated_at.isoformat()
             else:
                 updated_iso = str(updated_at)
-            key: Tuple[int, str] = (int(entry_id), updated_iso)
+            return (int(entry_id), updated_iso)
         except Exception:
             # Fallback key without updated_at; reduces cache usefulness but stays safe
-            key = (int(entry_id), "")
+            return (int(entry_id), "")
 
-        # Check cache
-        now_ts = datetime.now().timestamp()
+    def _cached_insights(self, key: Tuple[int, str], now_ts: float) -> Optional[Dict[str, Any]]:
         cached = self._insights_cache.get(key)
         if cached:
             ts, data = cached
             if now_ts - ts <= self._insights_cache_ttl:
                 return data
+        return None
+
+    def insights_etag(self, entry_id: int, updated_at: Any) -> Optional[str]:
+        """
+        Returns an ETag for the cached analysis of this entry version, derived from the cache
+        key and the time it was stored. Returns None when there is no fresh cache entry or the
+        cached result is a fallback, which should be retried rather than revalidated.
+        """
+        key = self._insights_cache_key(entry_id, updated_at)
+        cached = self._insights_cache.get(key)
+        if not cached:
+            return None
+        ts, data = cached
+        if datetime.now().timestamp() - ts > self._insights_cache_ttl or isinstance(data, _FallbackAnalysis):
+            return None
+        digest = hashlib.blake2b(repr((key, ts)).encode(), digest_size=8).hexdigest()
+        return f'W/"{key[0]}-{digest}"'
+
+    async def analyze_journal_entry_fast_cached(self, content: str, entry_id: int, user_id: str, updated_at: Any) -> Dict[str, Any]:
+        """Wrapper that caches analyze_journal_entry_fast by (entry_id, updated_at_iso)."""
+        key = self._insights_cache_key(entry_id, updated_at)
+
+        # Check cache
+        now_ts = datetime.now().timestamp()
+        data = self._cached_insights(key, now_ts)
+        if data is not None:
+            return data
 
         # Compute and store
         data = await self.analyze_journal_entry_fast(content, entry_id, user_id)
         self._insights_cache[key] = (now_ts, data)
         return data
 
+    async def batch_analyze_cached(self, entries: List[Dict], user_id: str, concurrency: int = 16) -> List[Any]:
+        """
+        Analyzes many entries at once, sharing the per-entry cache.
+
+        Cache hits are answered up front; the remaining entries (deduplicated by cache key)
+        are analyzed concurrently, at most `concurrency` at a time, and written back to the cache.
+
+        Returns:
+            One result per entry, in order; an entry whose analysis raised gets its exception.
+        """
+        now_ts = datetime.now().timestamp()
+        keys = [self._insights_cache_key(e["id"], e.get("updated_at")) for e in entries]
+        results: Dict[Tuple[int, str], Any] = {}
+        misses: Dict[Tuple[int, str], Dict] = {}
+        for key, entry in zip(keys, entries):
+            if key in results or key in misses:
+                continue
+            data = self._cached_insights(key, now_ts)
+            if data is not None:
+                results[key] = data
+            else:
+                misses[key] = entry
+
+        if misses:
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+
+            async def analyze(entry: Dict) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self.analyze_journal_entry_fast(entry.get("content", ""), int(entry["id"]), user_id)
+
+            computed = await asyncio.gather(*[analyze(entry) for entry in misses.values()], return_exceptions=True)
+            for key, data in zip(misses, computed):
+                results[key] = data
+                if not isinstance(data, BaseException):
+                    self._insights_cache[key] = (now_ts, data)
+
+        return [results[key] for key in keys]
+
     async def analyze_trends_fast(self, entries: List[Dict]) -> Dict[str, Any]:
         """Analyzes trends over a series of entries using Claude AI."""
         if not entries or len(entries) < 3:
@@ -364,37 +430,37 @@ Focus on being supportive and constructive. Identify meaningful patterns without
                 ]
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.base_url,
-                    headers=headers,
-                    json=data,
-                    timeout=45.0  # Longer timeout for trend analysis
-                )
+            client = get_client()
+            response = await client.post(
+                self.base_url,
+                headers=headers,
+                content=orjson.dumps(data),
+                timeout=45.0  # Longer timeout for trend analysis
+            )
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    claude_response = result["content"][0]["text"]
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                claude_response = result["content"][0]["text"]
                     
-                    try:
-                        trends = json.loads(claude_response)
-                        # Validate and provide defaults
-                        return {
-                            "overall_sentiment_trend": trends.get("overall_sentiment_trend", "stable"),
-                            "dominant_themes": trends.get("dominant_themes", []),
-                            "emotional_patterns": trends.get("emotional_patterns", []),
-                            "growth_indicators": trends.get("growth_indicators", ["Consistent journaling shows self-awareness."]),
-                            "areas_of_concern": trends.get("areas_of_concern", []),
-                            "recommendations": trends.get("recommendations", ["Continue exploring your thoughts and feelings."]),
-                            "insights_summary": trends.get("insights_summary", "Your journaling practice shows thoughtful self-reflection.")
-                        }
-                    except json.JSONDecodeError:
-                        print(f"Failed to parse Claude trends JSON: {claude_response}")
-                        return self._create_empty_trends()
-                        
-                else:
-                    print(f"Claude API Error for trends: {response.status_code} - {response.text}")
+                try:
+                    trends = json.loads(claude_response)
+                    # Validate and provide defaults
+                    return {
+                        "overall_sentiment_trend": trends.get("overall_sentiment_trend", "stable"),
+                        "dominant_themes": trends.get("dominant_themes", []),
+                        "emotional_patterns": trends.get("emotional_patterns", []),
+                        "growth_indicators": trends.get("growth_indicators", ["Consistent journaling shows self-awareness."]),
+                        "areas_of_concern": trends.get("areas_of_concern", []),
+                        "recommendations": trends.get("recommendations", ["Continue exploring your thoughts and feelings."]),
+                        "insights_summary": trends.get("insights_summary", "Your journaling practice shows thoughtful self-reflection.")
+                    }
+                except json.JSONDecodeError:
+                    print(f"Failed to parse Claude trends JSON: {claude_response}")
                     return self._create_empty_trends()
+                        
+            else:
+                print(f"Claude API Error for trends: {response.status_code} - {response.text}")
+                return self._create_empty_trends()
                     
         except Exception as e:
             print(f"Error calling Claude API for trends: {e}")
@@ -405,7 +471,7 @@ Focus on being supportive and constructive. Identify meaningful patterns without
         def quick_summary(text: str) -> str:
             t = (text or "").strip().replace("\n", " ")
             return (t[:140] + "…") if len(t) > 140 else (t or "Journal entry analyzed.")
-        return {
+        return _FallbackAnalysis({
             "summary": quick_summary(content),
             "emotions": [{"emotion": "reflective", "intensity": 0.7, "description": "Engaging in self-reflection."}],
             "themes": [{"theme": "Personal Reflection", "relevance": 0.8, "description": "General life reflection."}],
@@ -414,7 +480,7 @@ Focus on being supportive and constructive. Identify meaningful patterns without
             "key_insights": ["You took time for valuable self-reflection."],
             "growth_areas": ["Maintaining a consistent reflective practice."],
             "support_suggestions": ["Continue exploring your thoughts and feelings in this space."],
-        }
+        })
 
     def _create_empty_trends(self) -> Dict[str, Any]:
         """Creates a generic response for when trend analysis isn't possible."""
@@ -4,7 +4,7 @@ import os
 import sys
 import subprocess
 from pathlib import Path
-from dotenv import load_dotenv
+from dotenv import dotenv_values
 
 def check_requirements():
     """Check if required dependencies are installed"""
@@ -89,7 +89,7 @@ def start_server():
     
     try:
         import uvicorn
-        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, timeout_keep_alive=75)
     except KeyboardInterrupt:
         print("\nServer stopped.")
     except Exception as e:
@@ -103,9 +103,10 @@ def main():
     backend_dir = Path(__file__).parent
     os.chdir(backend_dir)
     
-    # Load environment variables from backend/.env then project root .env
-    load_dotenv(backend_dir / ".env")
-    load_dotenv(backend_dir.parent / ".env")
+    # Load environment variables from backend/.env and project root .env (backend/.env wins)
+    for key, value in {**dotenv_values(backend_dir.parent / ".env"), **dotenv_values(backend_dir / ".env")}.items():
+        if value is not None:
+            os.environ.setdefault(key, value)
     
     # Check requirements
     if not check_requirements():
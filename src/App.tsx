@@ -190,7 +190,7 @@ function App() {
       }
 
       // Send current journal text to get an updated prompt
-      const response = await fetch(`${apiBase}/chat`, {
+      const response = await fetch(`${apiBase}/chat/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -202,14 +202,31 @@ function App() {
         }),
       })
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Failed to get updated prompt')
       }
 
-      const data = await response.json()
-      
-      // Update the prompt with AI guidance
-      setCurrentPrompt(data.response)
+      // Update the prompt with AI guidance as tokens arrive (server-sent events)
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let reply = ''
+      for (;;) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split('\n\n')
+        buffer = events.pop() ?? ''
+        for (const event of events) {
+          if (!event.startsWith('data: ')) continue
+          const payload = event.slice(6)
+          if (payload === '[DONE]') continue
+          try {
+            reply += JSON.parse(payload).content ?? ''
+            setCurrentPrompt(reply)
+          } catch {}
+        }
+      }
 
       // Update the journal entry in the database if we have an ID
       if (currentJournalId) {